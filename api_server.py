@@ -0,0 +1,323 @@
+"""
+Headless chat API: streams get_response_with_rag answers as server-sent events.
+
+    python api_server.py --port 8080
+
+    curl -N -X POST localhost:8080/chat -H 'Content-Type: application/json' \\
+         -d '{"session_id": "abc", "message": "What woods do you use?"}'
+
+Events are 'session' (the session id to send with later turns), 'message' ({"text": ...} chunks)
+and 'done'. Conversation state is kept in the shared session store, so any process can serve a turn.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from bedrock_utils import get_response_with_rag, update_cs_state
+from history_utils import CHAT_HISTORY_WINDOW, ConversationMemory
+from intent_router import RoutedPrompt
+from metrics_utils import metrics
+
+logger = logging.getLogger(__name__)
+
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', '64'))
+API_CLIENT_CONCURRENCY = int(os.getenv('API_CLIENT_CONCURRENCY', '2'))
+# Chunks buffered per stream before a slow client pauses generation
+API_STREAM_BUFFER = int(os.getenv('API_STREAM_BUFFER', '32'))
+API_REQUEST_TIMEOUT = float(os.getenv('API_REQUEST_TIMEOUT', '10'))
+# Seconds a client may leave a stream chunk unread before it is treated as gone
+API_WRITE_TIMEOUT = float(os.getenv('API_WRITE_TIMEOUT', '30'))
+API_MAX_BODY = 64 * 1024
+# Peer addresses (e.g. the load balancer) whose X-Client-Id header is trusted; empty trusts none
+API_TRUSTED_PROXIES = frozenset(filter(None, (address.strip() for address in os.getenv('API_TRUSTED_PROXIES', '').split(','))))
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+               408: 'Request Timeout', 413: 'Payload Too Large', 429: 'Too Many Requests',
+               503: 'Service Unavailable'}
+
+_END = object()
+
+
+class ChatServer:
+    """
+    asyncio HTTP server for the chat pipeline.
+    Turns run on a bounded thread pool; each client (its address, or the X-Client-Id header when
+    the request comes through one of trusted_proxies) may have client_concurrency turns in flight
+    and the server max_concurrency in total, beyond which requests are rejected with 429/503
+    instead of queueing. Streams buffer at most stream_buffer chunks, so a slow reader pauses
+    generation rather than growing memory; one that reads nothing for API_WRITE_TIMEOUT is
+    disconnected and its turn cancelled.
+    """
+
+    def __init__(self, agent_runtime_client, runtime_client, session_store, dynamodb=None, retriever=None,
+                 name_index=None, max_concurrency: int = API_MAX_CONCURRENCY,
+                 client_concurrency: int = API_CLIENT_CONCURRENCY, stream_buffer: int = API_STREAM_BUFFER,
+                 trusted_proxies=API_TRUSTED_PROXIES):
+        self.agent_runtime_client = agent_runtime_client
+        self.runtime_client = runtime_client
+        self.session_store = session_store
+        self.dynamodb = dynamodb
+        self.retriever = retriever
+        self.name_index = name_index
+        self.max_concurrency = max_concurrency
+        self.client_concurrency = client_concurrency
+        self.stream_buffer = stream_buffer
+        self.trusted_proxies = frozenset(trusted_proxies)
+        self.active = 0
+        self.active_by_client = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='chat-api')
+        self._server = None
+        metrics.register_gauge('api_active_streams', lambda: self.active)
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        self._server = await asyncio.start_server(self._handle, host, port)
+        logger.info("Chat API listening on %s:%d", host, self._server.sockets[0].getsockname()[1])
+        return self._server
+
+    @property
+    def port(self) -> int:
+        return self._server.sockets[0].getsockname()[1]
+
+    async def _read_request(self, reader: asyncio.StreamReader) -> Tuple[str, str, Dict[str, str], bytes]:
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        method, path, _ = request_line.split(' ', 2)
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            if len(headers) >= 100:
+                raise ValueError("too many headers")
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', '0'))
+        if length > API_MAX_BODY:
+            raise OverflowError
+        body = await reader.readexactly(length) if length else b''
+        return method, path.split('?', 1)[0], headers, body
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, payload: Dict,
+                       extra_headers: Dict[str, str] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'Content-Length': str(len(body)), 'Connection': 'close'}
+        headers.update(extra_headers or {})
+        head = f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n" + "".join(
+            f"{name}: {value}\r\n" for name, value in headers.items()
+        ) + "\r\n"
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            try:
+                method, path, headers, body = await asyncio.wait_for(self._read_request(reader), API_REQUEST_TIMEOUT)
+            except asyncio.TimeoutError:
+                await self._respond(writer, 408, {'error': 'request timeout'})
+                return
+            except OverflowError:
+                await self._respond(writer, 413, {'error': 'request body too large'})
+                return
+            except (ValueError, asyncio.IncompleteReadError):
+                await self._respond(writer, 400, {'error': 'malformed request'})
+                return
+
+            if path == '/healthz':
+                await self._respond(writer, 200, {'status': 'ok', 'active': self.active})
+            elif path != '/chat':
+                await self._respond(writer, 404, {'error': 'not found'})
+            elif method != 'POST':
+                await self._respond(writer, 405, {'error': 'use POST'}, {'Allow': 'POST'})
+            else:
+                await self._chat(writer, self._client_key(writer, headers), body)
+        except ConnectionError:
+            pass
+        except Exception as e:
+            logger.error("Chat API request failed: %s", e, exc_info=True)
+        finally:
+            writer.close()
+
+    def _client_key(self, writer: asyncio.StreamWriter, headers: Dict[str, str]) -> str:
+        """Key for the per-client limit; a client-supplied header would let anyone dodge it"""
+        peer = writer.get_extra_info('peername')
+        address = peer[0] if peer else 'unknown'
+        if address in self.trusted_proxies and headers.get('x-client-id'):
+            return headers['x-client-id']
+        return address
+
+    async def _chat(self, writer: asyncio.StreamWriter, client: str, body: bytes) -> None:
+        try:
+            request = json.loads(body or b'{}')
+            message = str(request['message']).strip()
+        except (ValueError, KeyError, TypeError):
+            await self._respond(writer, 400, {'error': 'expected JSON with a "message" field'})
+            return
+        if not message:
+            await self._respond(writer, 400, {'error': 'message is empty'})
+            return
+        session_id = str(request.get('session_id') or uuid.uuid4().hex)
+
+        # Shed load instead of queueing: queued streams would only add to everyone's latency
+        if self.active >= self.max_concurrency:
+            metrics.increment('api_rejected_total', reason='server_busy')
+            await self._respond(writer, 503, {'error': 'server busy'}, {'Retry-After': '1'})
+            return
+        if self.active_by_client.get(client, 0) >= self.client_concurrency:
+            metrics.increment('api_rejected_total', reason='client_limit')
+            await self._respond(writer, 429, {'error': 'too many concurrent requests'}, {'Retry-After': '1'})
+            return
+
+        self.active += 1
+        self.active_by_client[client] = self.active_by_client.get(client, 0) + 1
+        try:
+            await self._stream(writer, session_id, message)
+        finally:
+            self.active -= 1
+            self.active_by_client[client] -= 1
+            if not self.active_by_client[client]:
+                del self.active_by_client[client]
+
+    async def _stream(self, writer: asyncio.StreamWriter, session_id: str, message: str) -> None:
+        loop = asyncio.get_running_loop()
+        chunks = asyncio.Queue(maxsize=self.stream_buffer)
+        cancelled = threading.Event()
+
+        def emit(item) -> None:
+            # Blocks the worker while the buffer is full, pausing generation for slow readers
+            asyncio.run_coroutine_threadsafe(chunks.put(item), loop).result()
+
+        def produce() -> None:
+            try:
+                self.run_turn(session_id, message, emit, cancelled)
+            except Exception as e:
+                logger.error("Chat API turn failed: %s", e, exc_info=True)
+            finally:
+                emit(_END)
+
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+            b"Connection: close\r\nX-Accel-Buffering: no\r\n\r\n"
+            + _event('session', {'session_id': session_id})
+        )
+        loop.run_in_executor(self._executor, produce)
+
+        connected = True
+        while True:
+            chunk = await chunks.get()
+            if chunk is _END:
+                break
+            if not connected:
+                # Keep draining so the worker is never left blocked on a full buffer
+                continue
+            try:
+                writer.write(_event('message', {'text': chunk}))
+                # A client that holds the connection open but stops reading would otherwise
+                # block this drain, and with it the worker and its model stream, forever
+                await asyncio.wait_for(writer.drain(), API_WRITE_TIMEOUT)
+            except (ConnectionError, asyncio.TimeoutError):
+                logger.info("Client for session %s disconnected or stopped reading mid-stream", session_id)
+                connected = False
+                cancelled.set()
+                writer.transport.abort()
+        if connected:
+            writer.write(_event('done', {'session_id': session_id}))
+            try:
+                await asyncio.wait_for(writer.drain(), API_WRITE_TIMEOUT)
+            except asyncio.TimeoutError:
+                writer.transport.abort()
+
+    def run_turn(self, session_id: str, message: str, emit, cancelled: Optional[threading.Event] = None) -> None:
+        """Answer one message for a session on a worker thread, emitting chunks as they stream"""
+        stored = self.session_store.load(session_id, limit=CHAT_HISTORY_WINDOW) or {'state': {}, 'messages': []}
+        state = {'cs_mode': False, 'phone_number': None, 'call_job_id': None, **stored['state']}
+        memory = ConversationMemory()
+        for previous in stored['messages']:
+            memory.add(previous['role'], previous['content'])
+
+        routed = RoutedPrompt(message)
+        if routed.is_cs_request:
+            state['cs_mode'] = True
+
+        chunks = []
+        generator = get_response_with_rag(
+            self.agent_runtime_client,
+            self.runtime_client,
+            message,
+            phone_number=state['phone_number'] if state['cs_mode'] else None,
+            dynamodb=self.dynamodb,
+            retriever=self.retriever,
+            name_index=self.name_index,
+            memory=memory
+        )
+        try:
+            for chunk in generator:
+                if cancelled is not None and cancelled.is_set():
+                    return
+                chunks.append(chunk)
+                emit(chunk)
+        finally:
+            generator.close()
+
+        full_response = "".join(chunks)
+        if state['cs_mode']:
+            update_cs_state(state, message, routed, full_response)
+        self.session_store.append_messages(session_id, [
+            {'role': 'user', 'content': message},
+            {'role': 'assistant', 'content': full_response}
+        ])
+        self.session_store.update_state(session_id, **state)
+
+    def shutdown(self) -> None:
+        if self._server is not None:
+            self._server.close()
+        self._executor.shutdown(wait=False)
+
+
+def _event(name: str, data: Dict) -> bytes:
+    return f"event: {name}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def main():
+    from bedrock_utils import init_bedrock
+    from customer_index import init_customer_index
+    from dynamo_utils import init_dynamodb
+    from metrics_utils import start_metrics_server
+    from retriever_utils import init_retriever
+    from session_store import init_session_store
+
+    parser = argparse.ArgumentParser(description="Headless streaming chat API")
+    parser.add_argument('--host', default=os.getenv('API_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('API_PORT', '8080')))
+    args = parser.parse_args()
+
+    agent_runtime_client, runtime_client = init_bedrock()
+    dynamodb = init_dynamodb()
+    server = ChatServer(
+        agent_runtime_client,
+        runtime_client,
+        init_session_store(),
+        dynamodb=dynamodb,
+        retriever=init_retriever(agent_runtime_client),
+        name_index=init_customer_index(dynamodb)
+    )
+    start_metrics_server()
+
+    async def serve():
+        async with await server.start(args.host, args.port) as listener:
+            await listener.serve_forever()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
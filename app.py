@@ -1,11 +1,46 @@
+import uuid
+
 import streamlit as st
-from bedrock_utils import init_bedrock, get_response_with_rag
+from bedrock_utils import init_bedrock, get_response_with_rag, get_call_dispatcher, update_cs_state
 from dynamo_utils import init_dynamodb
+from retriever_utils import init_retriever
+from customer_index import init_customer_index
+from render_utils import StreamRenderBuffer
+from history_utils import CHAT_HISTORY_WINDOW, ChatArchive, ConversationMemory, compact_history
+from intent_router import RoutedPrompt
+from metrics_utils import start_metrics_server
+from session_store import init_session_store
 
 # Initialize Bedrock clients
 bedrock_client, runtime_client = init_bedrock()
 dynamodb = init_dynamodb()
 
+
+@st.cache_resource
+def load_retriever():
+    """Build the knowledge base retriever once per server process"""
+    return init_retriever(bedrock_client)
+
+
+@st.cache_resource
+def load_name_index():
+    """Build the customer name index once per server process"""
+    return init_customer_index(dynamodb)
+
+
+@st.cache_resource
+def load_session_store():
+    """Open the shared session store once per server process"""
+    return init_session_store()
+
+
+retriever = load_retriever()
+name_index = load_name_index()
+session_store = load_session_store()
+
+# Expose /metrics on METRICS_PORT when set
+start_metrics_server()
+
 # Set page config with custom theme
 st.set_page_config(
     page_title="Rivertown Ball Company",
@@ -56,24 +91,55 @@ with col2:
         </p>
     """, unsafe_allow_html=True)
 
-# Initialize session state variables
+# The session id lives in the URL so any server process can pick the conversation up
+if "session" not in st.query_params:
+    st.query_params["session"] = uuid.uuid4().hex
+session_id = st.query_params["session"]
+
+# Initialize session state variables, resuming a stored conversation when there is one
 if "messages" not in st.session_state:
-    st.session_state.messages = []
-    # Add welcome message
-    st.session_state.messages.append({
-        "role": "assistant",
-        "content": "Welcome to Rivertown Ball Company! How can I help you today?"
-    })
+    stored_session = session_store.load(session_id, limit=CHAT_HISTORY_WINDOW)
+    if stored_session:
+        st.session_state.messages = stored_session["messages"]
+        for key, value in stored_session["state"].items():
+            st.session_state[key] = value
+        st.session_state.memory = ConversationMemory()
+        for message in stored_session["messages"]:
+            st.session_state.memory.add(message["role"], message["content"])
+    else:
+        # Add welcome message
+        st.session_state.messages = [{
+            "role": "assistant",
+            "content": "Welcome to Rivertown Ball Company! How can I help you today?"
+        }]
+        session_store.append_messages(session_id, st.session_state.messages)
 if "phone_number" not in st.session_state:
     st.session_state.phone_number = None
 if "cs_mode" not in st.session_state:
     st.session_state.cs_mode = False
+if "call_job_id" not in st.session_state:
+    st.session_state.call_job_id = None
+if "archive" not in st.session_state:
+    st.session_state.archive = ChatArchive()
+if "memory" not in st.session_state:
+    st.session_state.memory = ConversationMemory()
+
+# Keep only the most recent messages inline; older turns are compacted into the archive
+compact_history(st.session_state.messages, st.session_state.archive)
 
 # Create a container for chat messages
 chat_container = st.container()
 
 # Display chat messages from history on app rerun
 with chat_container:
+    archive = st.session_state.archive
+    if len(archive):
+        with st.expander(f"Earlier messages ({len(archive)})"):
+            page_count = (len(archive) + 9) // 10
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, key="archive_page") if page_count > 1 else 1
+            for record in archive.page(page, page_size=10):
+                st.markdown(f"**{record.role.title()}:** {archive.load(record)}")
+    
     for message in st.session_state.messages:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
@@ -90,22 +156,14 @@ if prompt := st.chat_input("Ask about our wooden balls..."):
     # Display assistant response in chat message container
     with st.chat_message("assistant"):
         message_placeholder = st.empty()
+        render_buffer = StreamRenderBuffer(message_placeholder)
         full_response = ""
         
-        # Check for CS keywords or if we're already in CS mode
-        cs_keywords = [
-            'speak to someone',
-            'talk to a person', 
-            'customer service',
-            'representative',
-            'speak to a human',
-            'talk to someone',
-            'call me',
-            'contact me'
-        ]
+        # Route features (CS keywords, digit count) are computed once per prompt
+        routed = RoutedPrompt(prompt)
         
         # Enter CS mode if keywords detected
-        if any(keyword in prompt.lower() for keyword in cs_keywords):
+        if routed.is_cs_request:
             st.session_state.cs_mode = True
         
         # Handle the CS flow
@@ -116,44 +174,68 @@ if prompt := st.chat_input("Ask about our wooden balls..."):
                 runtime_client,
                 prompt,
                 phone_number=st.session_state.phone_number,
-                dynamodb=dynamodb
+                dynamodb=dynamodb,
+                retriever=retriever,
+                name_index=name_index,
+                memory=st.session_state.memory
             ):
-                full_response += response_chunk
-                message_placeholder.markdown(full_response + "▌")
-            message_placeholder.markdown(full_response)
-            
-            # Update state based on response
-            if "what's the best phone number" in full_response.lower():
-                st.session_state.phone_number = None
-            elif sum(c.isdigit() for c in prompt) >= 10:
-                st.session_state.phone_number = prompt
+                render_buffer.append(response_chunk)
+            full_response = render_buffer.finish()
             
-            # Reset CS mode if call is initiated
-            if "sara will be calling you right now" in full_response.lower():
-                st.session_state.cs_mode = False
-                st.session_state.phone_number = None
+            # Update phone number, CS mode and call job based on response
+            update_cs_state(st.session_state, prompt, routed, full_response)
         else:
             # Regular RAG response for non-CS interactions
             for response_chunk in get_response_with_rag(
                 bedrock_client,
                 runtime_client,
                 prompt,
-                dynamodb=dynamodb
+                dynamodb=dynamodb,
+                retriever=retriever,
+                name_index=name_index,
+                memory=st.session_state.memory
             ):
-                full_response += response_chunk
-                message_placeholder.markdown(full_response + "▌")
-            message_placeholder.markdown(full_response)
+                render_buffer.append(response_chunk)
+            full_response = render_buffer.finish()
             
     # Add assistant response to chat history
     st.session_state.messages.append({"role": "assistant", "content": full_response})
+    
+    # Fold the completed turn into the model's conversation memory
+    st.session_state.memory.add("user", prompt)
+    st.session_state.memory.add("assistant", full_response)
+    
+    # Persist only the new turn and the flags it may have changed
+    session_store.append_messages(session_id, st.session_state.messages[-2:])
+    session_store.update_state(
+        session_id,
+        cs_mode=st.session_state.cs_mode,
+        phone_number=st.session_state.phone_number,
+        call_job_id=st.session_state.call_job_id
+    )
 
 # Sidebar with reset button and additional info
 with st.sidebar:
     st.markdown("### Chat Controls")
+    if st.session_state.call_job_id:
+        call_job = get_call_dispatcher().get_job(st.session_state.call_job_id)
+        if call_job:
+            call_status = {
+                'queued': "📞 Call queued",
+                'dispatching': "📞 Connecting you with Sara...",
+                'retrying': "📞 Retrying the call...",
+                'placed': "✅ Sara is calling you now",
+                'failed': "❌ We couldn't place the call. Please call us at (719) 266-2837"
+            }
+            st.markdown(call_status.get(call_job.status, call_job.status))
     if st.button("Reset Chat", key="reset"):
         st.session_state.messages = []
         st.session_state.phone_number = None
         st.session_state.cs_mode = False
+        st.session_state.call_job_id = None
+        st.session_state.archive.clear()
+        st.session_state.memory.clear()
+        session_store.delete(session_id)
         st.rerun()
     
     st.markdown("---")
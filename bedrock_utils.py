@@ -1,11 +1,19 @@
-import boto3
 import os
-from dotenv import load_dotenv
-import json
 import logging
-from dynamo_utils import get_customer_orders, init_dynamodb
-import re
-import requests
+import time
+from dynamo_utils import get_customer_orders, get_orders_for_customers, init_dynamodb
+from retriever_utils import BedrockRetriever
+from cache_utils import TTLCache, normalize_text
+from context_utils import assemble_context
+import hashlib
+import itertools
+from client_utils import get_bedrock_agent_runtime, get_bedrock_runtime, get_bland_session, bland_timeout
+from call_queue import CallDispatcher, dispatcher_settings
+from metrics_utils import metrics, span
+from model_utils import ModelStream, ModelUnavailable
+from intent_router import RoutedPrompt, build_default_router
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Tuple
 
 # Configure logger
@@ -15,133 +23,161 @@ logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
+# Orders rendered inline per page before offering "show more"
+ORDER_PAGE_SIZE = int(os.getenv('ORDER_PAGE_SIZE', '25'))
+
+# Background dispatcher for customer service calls, see get_call_dispatcher()
+_call_dispatcher = None
+_call_dispatcher_lock = threading.Lock()
+
+# Knowledge base retrieval started speculatively alongside intent routing; sized to the chat API's
+# concurrency, and when every worker is busy the turn retrieves inline instead of queueing
+SPECULATIVE_RETRIEVAL = os.getenv('SPECULATIVE_RETRIEVAL', 'true').lower() != 'false'
+RETRIEVAL_WORKERS = int(os.getenv('RETRIEVAL_WORKERS', os.getenv('API_MAX_CONCURRENCY', '64')))
+_retrieval_executor = ThreadPoolExecutor(max_workers=RETRIEVAL_WORKERS, thread_name_prefix='retrieval')
+_retrieval_slots = threading.BoundedSemaphore(RETRIEVAL_WORKERS)
+
+# Completed RAG answers keyed on normalized prompt and retrieved context hash
+answer_cache = TTLCache(
+    max_size=int(os.getenv('ANSWER_CACHE_SIZE', '256')),
+    ttl=float(os.getenv('ANSWER_CACHE_TTL', '3600'))
+)
+metrics.register_gauge('answer_cache_entries', lambda: len(answer_cache))
+metrics.register_gauge('answer_cache_hit_rate', lambda: answer_cache.stats()['hit_rate'])
+
+# Last good answer per question, served only when no model can answer in time
+fallback_answers = TTLCache(
+    max_size=int(os.getenv('ANSWER_FALLBACK_SIZE', '1024')),
+    ttl=float(os.getenv('ANSWER_FALLBACK_TTL', '86400'))
+)
+
 def init_bedrock():
-    """Initialize and return Bedrock clients"""
-    load_dotenv('.env.local')
-    
-    # Set default region if not specified in environment
-    region = os.getenv('AWS_REGION', 'us-east-1')
-    
-    # Common AWS credentials
-    aws_config = {
-        'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID'),
-        'aws_secret_access_key': os.getenv('AWS_SECRET_ACCESS_KEY'),
-        'region_name': region
-    }
-    
-    # Initialize bedrock-runtime client
-    bedrock_runtime = boto3.client(
-        service_name="bedrock-runtime",
-        **aws_config
-    )
-    
-    # Initialize bedrock-agent-runtime client for knowledge base operations
-    bedrock_agent_runtime = boto3.client(
-        service_name="bedrock-agent-runtime",
-        **aws_config
-    )
-    
-    return bedrock_agent_runtime, bedrock_runtime
+    """Return the shared Bedrock clients, created on first use"""
+    return get_bedrock_agent_runtime(), get_bedrock_runtime()
 
-def extract_customer_name(prompt: str) -> tuple[str, str] | None:
-    """Extract first and last name from prompt using regex"""
-    patterns = [
-        r"show\s+(?:me\s+)?(?:the\s+)?(?:orders?\s+(?:for|of)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)",
-        r"(?:what\s+(?:are|were)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)(?:'s)?\s+orders?",
-        r"find\s+(?:the\s+)?orders?\s+(?:for|of)\s+([a-zA-Z]+)\s+([a-zA-Z]+)",
-    ]
+def iter_order_table(orders: list, show_customer: bool = False, page: int = 1, page_size: int = None, more_prompt: str = None):
+    """
+    Yield a markdown order table piece by piece: header, one chunk per row, then a summary row.
+    With page_size set only that page of rows is rendered, followed by a 'show more' hint;
+    a page past the end is clamped to the last page with a note saying so.
+    """
+    if page_size:
+        page_count = max(1, -(-len(orders) // page_size))
+        if page > page_count:
+            yield (f"\nThere {'is' if page_count == 1 else 'are'} only {page_count} "
+                   f"page{'' if page_count == 1 else 's'} of orders, so here is page {page_count}.\n")
+            page = page_count
     
-    for pattern in patterns:
-        match = re.search(pattern, prompt.lower())
-        if match:
-            return match.group(1).title(), match.group(2).title()
-    return None
-
-def format_order_table(orders: list) -> str:
-    """Format orders into a clean markdown table with emojis"""
     # Create markdown table header with emojis
-    table = "\n📦 **Order History**\n"
-    table += "| 🔖 Order ID | ⚪ Product | 🔢 Quantity | 📅 Date | 💰 Total |\n"
-    table += "|------------|------------|-------------|---------|----------|\n"
+    header = "\n📦 **Order History**\n"
+    if show_customer:
+        header += "| 👤 Customer | 🔖 Order ID | ⚪ Product | 🔢 Quantity | 📅 Date | 💰 Total |\n"
+        header += "|------------|------------|------------|-------------|---------|----------|\n"
+    else:
+        header += "| 🔖 Order ID | ⚪ Product | 🔢 Quantity | 📅 Date | 💰 Total |\n"
+        header += "|------------|------------|-------------|---------|----------|\n"
+    yield header
+    
+    start = (page - 1) * page_size if page_size else 0
+    end = start + page_size if page_size else len(orders)
     
-    # Add each order as a row
-    for order in orders:
+    # Add each order on the requested page as a row
+    for order in orders[start:end]:
         # Truncate order_id if too long
         order_id = order['order_id'][:8] + "..." if len(order['order_id']) > 8 else order['order_id']
         
         # Format the row
-        table += f"| {order_id} | {order['product']} | {order['quantity']} | {order['order_date']} | ${order['total_price']:.2f} |\n"
+        customer = f"| {order['customer']} " if show_customer else ""
+        yield f"{customer}| {order_id} | {order['product']} | {order['quantity']} | {order['order_date']} | ${order['total_price']:.2f} |\n"
     
-    return table
+    # Summary row covers every order, not just the rendered page
+    total_spend = sum(order['total_price'] for order in orders)
+    summary_cells = "| | " if show_customer else "| "
+    yield f"{summary_cells}**Total** | **{len(orders)} orders** | | | **${total_spend:,.2f}** |\n"
+    
+    if end < len(orders):
+        hint = f"\nShowing orders {start + 1}–{end} of {len(orders)}."
+        if more_prompt:
+            hint += f" Say \"{more_prompt} page {page + 1}\" to see more."
+        yield hint + "\n"
 
-def get_response_with_rag(agent_runtime_client, runtime_client, prompt, phone_number=None, dynamodb=None, knowledge_base_id="6U5LGL6AYD"):
-    """Gets a streaming response using RAG with Bedrock Knowledge Base and order lookup"""
-    try:
-        # 1. First priority: Check for order lookup request
-        name_match = extract_customer_name(prompt)
-        if name_match and dynamodb:
-            first_name, last_name = name_match
-            orders = get_customer_orders(dynamodb, first_name, last_name)
-            
-            if orders:
-                order_table = format_order_table(orders)
-                yield f"🔍 Here are the orders for {first_name} {last_name}:\n{order_table}"
-                return
-            else:
-                yield f"❌ I couldn't find any orders for {first_name} {last_name}."
-                return
+def format_order_table(orders: list, show_customer: bool = False) -> str:
+    """Format orders into a clean markdown table with emojis"""
+    return "".join(iter_order_table(orders, show_customer=show_customer))
 
-        # 2. Second priority: Handle customer service calls
-        cs_keywords = [
-            'speak to someone',
-            'talk to a person', 
-            'customer service',
-            'representative',
-            'speak to a human',
-            'talk to someone',
-            'call me',
-            'contact me'
-        ]
+def get_response_with_rag(agent_runtime_client, runtime_client, prompt, phone_number=None, dynamodb=None, knowledge_base_id="6U5LGL6AYD", retriever=None, use_answer_cache=True, name_index=None, speculative_retrieval=None, router=None, memory=None):
+    """
+    Gets a streaming response using RAG and order lookup.
+    Passages come from the given retriever, or the Bedrock Knowledge Base when none is passed.
+    Completed RAG answers are replayed from answer_cache unless use_answer_cache is False
+    or the prompt has conversation memory.
+    Model calls are bounded by ModelStream deadlines; when no model answers in time the last
+    good answer to the same question asked without conversation memory is replayed from
+    fallback_answers, or an apology is sent.
+    A CustomerNameIndex, when given, short-circuits order lookups for unknown names.
+    With speculative_retrieval, a loose order match ('show me X Y') starts retrieval in the
+    background while the customer is looked up, and falls through to RAG if there is no such
+    customer; the retrieval is discarded when the order handler answers instead.
+    Handlers are chosen by the IntentRouter passed as router, default_router otherwise.
+    A ConversationMemory, when given, adds the bounded conversation so far to the model prompt.
+    """
+    retrieval_future = None
+    try:
+        # Get retrieved passages from the configured retriever backend
+        if retriever is None:
+            retriever = BedrockRetriever(agent_runtime_client, knowledge_base_id)
+        if speculative_retrieval is None:
+            speculative_retrieval = SPECULATIVE_RETRIEVAL
         
-        is_cs_request = any(keyword in prompt.lower() for keyword in cs_keywords)
-        is_just_numbers = sum(c.isdigit() for c in prompt) >= 10
+        # Normalize the prompt once and compute every routing feature up front
+        with span('routing'):
+            routed = RoutedPrompt(prompt)
+        route_context = {'dynamodb': dynamodb, 'phone_number': phone_number, 'name_index': name_index}
         
-        if is_cs_request or phone_number or is_just_numbers:
-            cs_response = handle_customer_service_request(prompt, phone_number)
-            if cs_response:
-                yield cs_response
+        # A loose name match may well be a product question; overlap retrieval with the customer
+        # lookup so falling through to RAG doesn't pay for both round trips in turn
+        if speculative_retrieval and routed.loose_names and dynamodb:
+            retrieval_future = submit_retrieval(retriever, prompt)
+        
+        # 1-2. Try order lookup, customer service and phone capture handlers in priority order
+        for route in (router or default_router).matches(routed, route_context):
+            if route.handler is None:
+                break
+            chunks = route.handler(routed, route_context)
+            if chunks is not None:
+                logger.info("Routed prompt to %s handler", route.intent)
+                metrics.increment('chat_route_total', intent=route.intent)
+                yield from chunks
                 return
 
         # 3. Fall back to RAG if no specific handlers matched
-        logger.info(f"No specific handlers matched, falling back to RAG for: {prompt}")
+        logger.info("No specific handlers matched, falling back to RAG for: %s", prompt)
+        metrics.increment('chat_route_total', intent='rag')
         
-        # Get retrieved passages from knowledge base
-        retrieve_response = agent_runtime_client.retrieve(
-            knowledgeBaseId=knowledge_base_id,
-            retrievalQuery={
-                "text": prompt
-            },
-            retrievalConfiguration={
-                "vectorSearchConfiguration": {
-                    "numberOfResults": 3
-                }
-            }
-        )
+        with span('retrieve', speculative=str(retrieval_future is not None).lower()):
+            if retrieval_future is not None:
+                results = retrieval_future.result()
+            else:
+                results = retriever.retrieve(prompt, number_of_results=3)
         
-        # Extract and combine retrieved passages
-        retrieved_passages = []
-        for result in retrieve_response.get('retrievalResults', []):
-            content = (
-                result.get('content', {}).get('text', '') or
-                result.get('content', '') or
-                ''
-            )
-            if content:
-                retrieved_passages.append(content)
+        # Rank, dedupe and trim passages to the context token budget
+        context, _ = assemble_context(results)
+        conversation = memory.render() if memory is not None else ""
         
-        context = "\n".join(retrieved_passages)
+        # Replay a cached answer for the same question over the same context; follow-up turns
+        # depend on the conversation and would only fill the cache with keys never seen again
+        use_answer_cache = use_answer_cache and not conversation
+        cache_key = (normalize_text(prompt), hashlib.sha256(context.encode('utf-8')).hexdigest())
+        if use_answer_cache:
+            cached_chunks = answer_cache.get(cache_key)
+            if cached_chunks is not None:
+                logger.info("Answer cache hit for: %s", prompt)
+                metrics.increment('answer_cache_replays_total')
+                yield from cached_chunks
+                return
         
         # Format prompt for the model
+        conversation_section = f"\n{conversation}\n" if conversation else ""
         formatted_prompt = f"""Human: You are RiverTown's enthusiastic product specialist! You love talking about our artisanal creations and have a warm, friendly personality. You're passionate about craftsmanship and excited to share details about our products.
 
 Remember to:
@@ -150,15 +186,15 @@ Remember to:
 - Share your excitement about our products
 - Keep responses friendly and warm
 - If you don't know something specific, be honest but stay positive
-
+{conversation_section}
 Question: {prompt}
 
 Context: {context}
 
 Assistant:"""
 
-        # Get streaming response
-        body = json.dumps({
+        # Get streaming response within the first-token and total deadlines
+        model_stream = ModelStream(runtime_client, {
             "prompt": formatted_prompt,
             "max_tokens_to_sample": 2048,
             "temperature": 0.7,
@@ -168,33 +204,147 @@ Assistant:"""
         })
         
         logger.debug("Sending request to model...")
-        response = runtime_client.invoke_model_with_response_stream(
-            modelId="anthropic.claude-instant-v1",
-            body=body,
-            contentType="application/json",
-            accept="application/json"
-        )
-        
-        # Stream the response chunks with debug logging
-        for event in response.get('body'):
-            if 'chunk' in event:
-                chunk_data = json.loads(event['chunk']['bytes'].decode())
-                completion = chunk_data.get('completion', '')
-                logger.debug(f"Received chunk: {completion}")
+        completions = []
+        # Time spent waiting on the model only, not on the caller consuming chunks
+        model_seconds = 0.0
+        chunks = iter(model_stream)
+        try:
+            while True:
+                waited_from = time.perf_counter()
+                try:
+                    completion = next(chunks)
+                except StopIteration:
+                    break
+                finally:
+                    model_seconds += time.perf_counter() - waited_from
+                logger.debug("Received chunk: %s", completion)
+                completions.append(completion)
                 yield completion
+        except ModelUnavailable as e:
+            # Nothing was streamed yet, so a recent answer to the same question can stand in
+            logger.error("No model available for: %s (%s)", prompt, e)
+            stale_chunks = fallback_answers.get(normalize_text(prompt))
+            if stale_chunks is not None:
+                metrics.increment('answer_fallback_total', source='cache')
+                yield from stale_chunks
+                return
+            metrics.increment('answer_fallback_total', source='apology')
+            yield ("I'm sorry, our product specialist can't answer right now. "
+                   "Please try again in a moment or call us at (719) 266-2837.")
+            return
+        finally:
+            metrics.observe('stage_duration_seconds', model_seconds, stage='model_request')
+            chunks.close()
+        
+        if not model_stream.completed:
+            yield "\n\n_(This answer was cut short. Please ask again for the rest.)_"
+            return
+        
+        # Only cache answers that streamed to completion; an answer shaped by one session's
+        # conversation must never be replayed to another session asking the same words
+        if completions and not conversation:
+            fallback_answers.set(normalize_text(prompt), tuple(completions))
+            if use_answer_cache:
+                answer_cache.set(cache_key, tuple(completions))
         
     except Exception as e:
-        logger.error(f"Error in response generation: {str(e)}", exc_info=True)
+        logger.error("Error in response generation: %s", e, exc_info=True)
+        metrics.increment('chat_errors_total', stage='response')
         yield "I apologize, but I encountered an error while processing your request."
+    finally:
+        # Drop speculative retrieval that a higher-priority handler made unnecessary
+        if retrieval_future is not None:
+            retrieval_future.cancel()
+
+def submit_retrieval(retriever, prompt: str):
+    """Start retrieval on the shared pool, or return None when every worker is already busy"""
+    if not _retrieval_slots.acquire(blocking=False):
+        metrics.increment('speculative_retrieval_skipped_total', reason='saturated')
+        return None
+    future = _retrieval_executor.submit(retriever.retrieve, prompt, 3)
+    future.add_done_callback(lambda _: _retrieval_slots.release())
+    return future
+
+def handle_order_intent(routed: RoutedPrompt, context: dict):
+    """
+    Order lookup handler: renders orders for every customer named in the prompt.
+    Returns None to fall through to RAG when a loose name match turns out not to be a customer.
+    """
+    dynamodb = context['dynamodb']
+    name_index = context.get('name_index')
+    if len(routed.names) > 1:
+        return get_bulk_order_response(dynamodb, routed.names, name_index, page=routed.page)
+    
+    first_name, last_name = routed.names[0]
+    not_found = None if routed.loose_names else [f"❌ I couldn't find any orders for {first_name} {last_name}."]
+    
+    # Skip DynamoDB for names the index knows aren't customers
+    if name_index is not None:
+        resolved = name_index.resolve(first_name, last_name)
+        if resolved is None:
+            logger.info("Name index rules out %s %s, skipping DynamoDB", first_name, last_name)
+            return not_found
+        first_name, last_name = resolved
+    
+    orders = get_customer_orders(dynamodb, first_name, last_name)
+    if not orders:
+        return not_found if orders is None else [f"❌ I couldn't find any orders for {first_name} {last_name}."]
+    
+    return itertools.chain(
+        [f"🔍 Here are the orders for {first_name} {last_name}:\n"],
+        iter_order_table(
+            orders,
+            page=routed.page,
+            page_size=ORDER_PAGE_SIZE,
+            more_prompt=f"show orders for {first_name} {last_name}"
+        )
+    )
+
+def handle_cs_intent(routed: RoutedPrompt, context: dict):
+    """Customer service and phone capture handler; returns None to fall through to RAG"""
+    cs_response = handle_customer_service_request(routed.text, context.get('phone_number'), routed=routed)
+    return [cs_response] if cs_response else None
+
+def get_bulk_order_response(dynamodb, names, name_index=None, page=1):
+    """Looks up orders for several customers in one batch and renders a combined table"""
+    # Drop names the index rules out before touching DynamoDB
+    lookups = {}
+    for first_name, last_name in names:
+        resolved = name_index.resolve(first_name, last_name) if name_index is not None else (first_name, last_name)
+        if resolved is not None:
+            lookups[(first_name, last_name)] = resolved
+    
+    results = get_orders_for_customers(dynamodb, list(dict.fromkeys(lookups.values()))) if lookups else {}
+    
+    combined = []
+    missing = []
+    for name in names:
+        orders = results.get(lookups.get(name))
+        if orders:
+            display_name = " ".join(lookups[name])
+            combined.extend(dict(order, customer=display_name) for order in orders)
+        else:
+            missing.append(" ".join(name))
+    
+    if combined:
+        found = sorted({order['customer'] for order in combined})
+        yield f"🔍 Here are the orders for {', '.join(found)}:\n"
+        yield from iter_order_table(
+            combined,
+            show_customer=True,
+            page=page,
+            page_size=ORDER_PAGE_SIZE,
+            more_prompt=f"show orders for {' and '.join(found)}"
+        )
+    if missing:
+        yield f"\n❌ I couldn't find any orders for {', '.join(missing)}."
 
 def init_bland():
-    """Initialize Bland API configuration"""
-    load_dotenv('.env.local')
+    """Return the Bland API configuration with the shared keep-alive session"""
     return {
-        'headers': {
-            'Authorization': os.getenv('BLAND_API_KEY')
-        },
-        'base_url': 'https://us.api.bland.ai/v1'
+        'session': get_bland_session(),
+        'base_url': os.getenv('BLAND_BASE_URL', 'https://us.api.bland.ai/v1'),
+        'timeout': bland_timeout()
     }
 
 def extract_phone_number(prompt: str) -> str | None:
@@ -213,16 +363,66 @@ def extract_phone_number(prompt: str) -> str | None:
     # For any other length, return None
     return None
 
-def handle_customer_service_request(prompt: str, phone_number: str = None) -> str:
-    """Handles customer service related requests and initiates calls if needed"""
+def format_call_number(prompt: str) -> str:
+    """Format the last ten digits of a prompt as the +1 number Sara will call"""
+    return f"+1{''.join(filter(str.isdigit, prompt))[-10:]}"
+
+def format_call_confirmation(formatted_phone: str) -> str:
+    """Message confirming that Sara's call is on its way"""
+    return (f"Perfect! Sara will be calling you right now at " 
+           f"{formatted_phone[-10:-7]}-{formatted_phone[-7:-4]}-{formatted_phone[-4:]}. "
+           "She's looking forward to helping you with any questions you have about our "
+           "artisanal wooden balls!")
+
+def format_repeat_call_confirmation(job) -> str:
+    """Message for a repeated request while an earlier call job is still recent"""
+    phone = f"{job.phone_number[-10:-7]}-{job.phone_number[-7:-4]}-{job.phone_number[-4:]}"
+    if job.status == 'placed':
+        return (f"Sara's call to {phone} has already been placed, so your phone should be ringing "
+                "shortly. No need to request another one!")
+    return (f"Sara's call to {phone} is already queued and will come through in just a moment. "
+            "No need to request another one!")
+
+def place_bland_call(formatted_phone: str):
+    """Ask Bland to place Sara's follow-up call, returning the HTTP response"""
+    data = {
+        "phone_number": formatted_phone,
+        "task": """You are Sara from Rivertown Ball Company following up on a chat conversation they were just having, looking to ask them if they have any questions you can help with. 
+        Start the call with: "Hi, this is Sara from Rivertown Ball Company!"
+        Be warm, friendly and helpful while assisting with their questions about our artisanal wooden balls.
+        Make them feel valued and excited about our products!""",
+        "model": "turbo",
+        "voice": "Alexa",
+        "max_duration": 12,
+        "wait_for_greeting": True,
+        "temperature": 0.8
+    }
+    
+    bland_config = init_bland()
+    return bland_config['session'].post(
+        f"{bland_config['base_url']}/calls",
+        json=data,
+        timeout=bland_config['timeout']
+    )
+
+def get_call_dispatcher() -> CallDispatcher:
+    """Return the shared background dispatcher for Bland calls, created on first use"""
+    global _call_dispatcher
+    with _call_dispatcher_lock:
+        if _call_dispatcher is None:
+            _call_dispatcher = CallDispatcher(place_bland_call, **dispatcher_settings())
+    return _call_dispatcher
+
+def handle_customer_service_request(prompt: str, phone_number: str = None, dispatch_async: bool = True, routed: RoutedPrompt = None) -> str:
+    """
+    Handles customer service related requests and initiates calls if needed.
+    Calls are queued on the shared CallDispatcher unless dispatch_async is False.
+    """
     try:
         # Check if this is a customer service request or just a phone number
-        is_cs_request = any(keyword in prompt.lower() for keyword in [
-            'speak to someone', 'talk to a person', 'customer service',
-            'representative', 'speak to a human', 'talk to someone',
-            'call me', 'contact me'
-        ])
-        is_just_numbers = sum(c.isdigit() for c in prompt) >= 10
+        routed = routed or RoutedPrompt(prompt)
+        is_cs_request = routed.is_cs_request
+        is_just_numbers = routed.is_phone_number
         
         # Initial CS request
         if is_cs_request:
@@ -232,42 +432,54 @@ def handle_customer_service_request(prompt: str, phone_number: str = None) -> st
         
         # Handle phone number input
         if is_just_numbers:
-            formatted_phone = f"+1{''.join(filter(str.isdigit, prompt))[-10:]}"
+            formatted_phone = format_call_number(prompt)
             
-            # Initiate the call
-            data = {
-                "phone_number": formatted_phone,
-                "task": """You are Sara from Rivertown Ball Company following up on a chat conversation they were just having, looking to ask them if they have any questions you can help with. 
-                Start the call with: "Hi, this is Sara from Rivertown Ball Company!"
-                Be warm, friendly and helpful while assisting with their questions about our artisanal wooden balls.
-                Make them feel valued and excited about our products!""",
-                "model": "turbo",
-                "voice": "Alexa",
-                "max_duration": 12,
-                "wait_for_greeting": True,
-                "temperature": 0.8
-            }
+            # Queue the call so the chat can acknowledge without waiting on Bland
+            if dispatch_async:
+                job = get_call_dispatcher().submit(formatted_phone)
+                logger.info("Queued customer service call job %s", job.job_id)
+                if job.submissions > 1:
+                    return format_repeat_call_confirmation(job)
+                return format_call_confirmation(formatted_phone)
             
-            bland_config = init_bland()
-            response = requests.post(
-                f"{bland_config['base_url']}/calls",
-                json=data,
-                headers=bland_config['headers']
-            )
+            # Initiate the call
+            response = place_bland_call(formatted_phone)
             
             if response.status_code == 200:
-                return (f"Perfect! Sara will be calling you right now at " 
-                       f"{formatted_phone[-10:-7]}-{formatted_phone[-7:-4]}-{formatted_phone[-4:]}. "
-                       "She's looking forward to helping you with any questions you have about our "
-                       "artisanal wooden balls!")
+                return format_call_confirmation(formatted_phone)
             else:
-                logger.error(f"Failed to initiate customer service call: {response.text}")
+                logger.error("Failed to initiate customer service call: %s", response.text)
                 return ("I apologize, but I'm having trouble connecting with Sara at the moment. "
                        "Please try again in a few minutes or call us directly at (719) 266-2837")
         
         return None
         
     except Exception as e:
-        logger.error(f"Error in customer service request handling: {str(e)}", exc_info=True)
+        logger.error("Error in customer service request handling: %s", e, exc_info=True)
         return ("I apologize, but I'm experiencing technical difficulties arranging the call. "
-               "Please contact our customer service directly at (719) 266-2837")
\ No newline at end of file
+               "Please contact our customer service directly at (719) 266-2837")
+
+def update_cs_state(state, prompt: str, routed: RoutedPrompt, full_response: str) -> None:
+    """
+    Advance the customer service flow after a CS-mode response.
+    state is any mapping with phone_number, cs_mode and call_job_id keys (e.g. st.session_state).
+    """
+    # Update state based on response
+    if "what's the best phone number" in full_response.lower():
+        state['phone_number'] = None
+    elif routed.is_phone_number:
+        state['phone_number'] = prompt
+    
+    # Reset CS mode if call is initiated and remember the job for status polling
+    response_text = full_response.lower()
+    if "sara will be calling you right now" in response_text or "sara's call to" in response_text:
+        call_job = get_call_dispatcher().latest_job(format_call_number(prompt))
+        state['call_job_id'] = call_job.job_id if call_job else None
+        state['cs_mode'] = False
+        state['phone_number'] = None
+
+# Intent routes with their handlers; RAG has no handler and is answered inline above
+default_router = build_default_router()
+default_router.set_handler('orders', handle_order_intent)
+default_router.set_handler('customer_service', handle_cs_intent)
+default_router.set_handler('phone_capture', handle_cs_intent)
@@ -0,0 +1,69 @@
+"""
+Intent routing throughput: the IntentRouter against the inline routing it replaced.
+
+    python -m benchmarks.bench_intent_router --iterations 10000
+"""
+import argparse
+import re
+import time
+
+from intent_router import CS_KEYWORDS, build_default_router, RoutedPrompt
+
+SAMPLE_PROMPTS = [
+    "What woods do you use for your spheres?",
+    "How long does shipping take to Canada?",
+    "show me orders for Jane Doe",
+    "what are John Smith's orders",
+    "orders for Jane Doe and John Smith",
+    "I'd like to speak to someone please",
+    "can you call me",
+    "(719) 555-0123",
+    "Tell me about the white-glove delivery service",
+    "Do you offer custom engraving on maple balls?",
+]
+
+
+def legacy_route(prompt: str, dynamodb=None, phone_number=None) -> str:
+    """The routing decision as get_response_with_rag made it before the router existed"""
+    patterns = [
+        r"show\s+(?:me\s+)?(?:the\s+)?(?:orders?\s+(?:for|of)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)",
+        r"(?:what\s+(?:are|were)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)(?:'s)?\s+orders?",
+        r"find\s+(?:the\s+)?orders?\s+(?:for|of)\s+([a-zA-Z]+)\s+([a-zA-Z]+)",
+    ]
+    if dynamodb and any(re.search(pattern, prompt.lower()) for pattern in patterns):
+        return 'orders'
+    if any(keyword in prompt.lower() for keyword in CS_KEYWORDS):
+        return 'customer_service'
+    if phone_number or sum(c.isdigit() for c in prompt) >= 10:
+        return 'phone_capture'
+    return 'rag'
+
+
+def run(iterations: int) -> dict:
+    """Time routing decisions per second for the legacy scan and the compiled router"""
+    router = build_default_router()
+    context = {'dynamodb': object(), 'phone_number': None}
+    results = {}
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for prompt in SAMPLE_PROMPTS:
+            legacy_route(prompt, dynamodb=context['dynamodb'])
+    results['legacy'] = iterations * len(SAMPLE_PROMPTS) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for prompt in SAMPLE_PROMPTS:
+            router.route(RoutedPrompt(prompt), context)
+    results['router'] = iterations * len(SAMPLE_PROMPTS) / (time.perf_counter() - start)
+
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Intent routing throughput benchmark")
+    parser.add_argument('--iterations', type=int, default=10000)
+    args = parser.parse_args()
+
+    for name, rate in run(args.iterations).items():
+        print(f"{name:>8}: {rate:,.0f} routing decisions/sec")
@@ -0,0 +1,200 @@
+"""Local stand-ins for Bedrock, DynamoDB and Bland used by the benchmark harness"""
+import json
+import random
+import threading
+import time
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List
+
+from dynamo_utils import NAME_KEY_ATTRIBUTE, make_name_key
+
+FIRST_NAMES = ['Jane', 'John', 'Maria', 'Wei', 'Aisha', 'Liam', 'Olga', 'Ravi', 'Sofia', 'Noah']
+LAST_NAMES = ['Doe', 'Smith', 'Garcia', 'Chen', 'Khan', 'Murphy', 'Ivanova', 'Patel', 'Rossi', 'Brown']
+PRODUCTS = ['Maple Sphere', 'Walnut Orb', 'Cherry Ball', 'Oak Globe', 'Birch Bead']
+
+
+class FakeModelStream:
+    """bedrock-runtime stand-in whose stream has configurable first-token and inter-chunk delays"""
+
+    def __init__(self, first_token_delay: float = 0.3, chunk_delay: float = 0.02, chunks: int = 50,
+                 chunk_text: str = "Our artisans love maple. "):
+        self.first_token_delay = first_token_delay
+        self.chunk_delay = chunk_delay
+        self.chunks = chunks
+        self.chunk_text = chunk_text
+
+    def _events(self):
+        time.sleep(self.first_token_delay)
+        for i in range(self.chunks):
+            if i:
+                time.sleep(self.chunk_delay)
+            payload = {'completion': self.chunk_text}
+            if i == self.chunks - 1:
+                payload['amazon-bedrock-invocationMetrics'] = {'outputTokenCount': self.chunks * 6}
+            yield {'chunk': {'bytes': json.dumps(payload).encode()}}
+
+    def invoke_model_with_response_stream(self, **kwargs):
+        return {'body': self._events()}
+
+
+class FakeRetriever:
+    """Retriever stand-in with a fixed round-trip delay"""
+
+    def __init__(self, delay: float = 0.15, passages: List[str] = None):
+        self.delay = delay
+        self.knowledge_base_id = 'fake-kb'
+        self.passages = passages or [
+            "Our spheres are hand-turned from sustainably harvested maple, walnut and cherry.",
+            "White-glove delivery is available for domestic and international orders.",
+            "Every sphere is finished with natural oils and hand-polished.",
+        ]
+
+    def retrieve(self, query: str, number_of_results: int = 3) -> List[Dict]:
+        time.sleep(self.delay)
+        return [{'text': text, 'score': 1.0} for text in self.passages[:number_of_results]]
+
+
+def _condition_matches(condition, item: Dict) -> bool:
+    """Evaluate the Key/Attr equality and AND conditions dynamo_utils builds"""
+    expression = condition.get_expression()
+    if expression['operator'] == 'AND':
+        return all(_condition_matches(value, item) for value in expression['values'])
+    if expression['operator'] == '=':
+        attribute, value = expression['values']
+        return item.get(attribute.name) == value
+    raise NotImplementedError(f"Unsupported condition operator: {expression['operator']}")
+
+
+def _project(item: Dict, kwargs: Dict) -> Dict:
+    if 'ProjectionExpression' not in kwargs:
+        return dict(item)
+    names = kwargs.get('ExpressionAttributeNames', {})
+    attributes = [names.get(token.strip(), token.strip()) for token in kwargs['ProjectionExpression'].split(',')]
+    return {name: item[name] for name in attributes if name in item}
+
+
+class FakeTable:
+    """DynamoDB table stand-in with per-request latency and LastEvaluatedKey pagination"""
+
+    def __init__(self, name: str, items: List[Dict], latency: float = 0.02, page_size: int = 100):
+        self.name = name
+        self.items = items
+        self.latency = latency
+        self.page_size = page_size
+        self.key_schema = [{'AttributeName': 'customer_id', 'KeyType': 'HASH'}]
+        self.by_key = {item['customer_id']: item for item in items}
+        self.by_name_key = {}
+        for item in items:
+            self.by_name_key.setdefault(item.get(NAME_KEY_ATTRIBUTE), []).append(item)
+        self.requests = 0
+
+    def _page(self, matches: List[Dict], kwargs: Dict) -> Dict:
+        start = kwargs.get('ExclusiveStartKey', {}).get('offset', 0)
+        page = matches[start:start + self.page_size]
+        response = {'Items': [_project(item, kwargs) for item in page]}
+        if start + self.page_size < len(matches):
+            response['LastEvaluatedKey'] = {'offset': start + self.page_size}
+        return response
+
+    def query(self, **kwargs) -> Dict:
+        self.requests += 1
+        time.sleep(self.latency)
+        attribute, value = kwargs['KeyConditionExpression'].get_expression()['values']
+        return self._page(self.by_name_key.get(value, []), kwargs)
+
+    def scan(self, **kwargs) -> Dict:
+        self.requests += 1
+        time.sleep(self.latency)
+        start = kwargs.get('ExclusiveStartKey', {}).get('offset', 0)
+        page = self.items[start:start + self.page_size]
+        condition = kwargs.get('FilterExpression')
+        matches = [item for item in page if condition is None or _condition_matches(condition, item)]
+        response = {'Items': [_project(item, kwargs) for item in matches]}
+        if start + self.page_size < len(self.items):
+            response['LastEvaluatedKey'] = {'offset': start + self.page_size}
+        return response
+
+
+class FakeDynamoDB:
+    """DynamoDB resource stand-in holding one generated customer table"""
+
+    def __init__(self, customers: int = 1000, orders_per_customer: int = 20, latency: float = 0.02, seed: int = 7):
+        rng = random.Random(seed)
+        items = []
+        for i in range(customers):
+            first_name = FIRST_NAMES[i % len(FIRST_NAMES)]
+            last_name = f"{LAST_NAMES[(i // len(FIRST_NAMES)) % len(LAST_NAMES)]}{i // 100 or ''}"
+            items.append({
+                'customer_id': str(i),
+                'first_name': first_name,
+                'last_name': last_name,
+                NAME_KEY_ATTRIBUTE: make_name_key(first_name, last_name),
+                'orders': [
+                    {
+                        'order_id': f"ORD-{i:05d}-{n:04d}",
+                        'product': rng.choice(PRODUCTS),
+                        'quantity': Decimal(rng.randint(1, 12)),
+                        'order_date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                        'total_price': Decimal(f"{rng.uniform(20, 900):.2f}")
+                    }
+                    for n in range(orders_per_customer)
+                ]
+            })
+        self.table = FakeTable('Rivertownball-cus', items, latency=latency)
+
+    def Table(self, name: str) -> FakeTable:
+        return self.table
+
+    def batch_get_item(self, RequestItems: Dict) -> Dict:
+        self.table.requests += 1
+        time.sleep(self.table.latency)
+        responses = {}
+        for table_name, request in RequestItems.items():
+            responses[table_name] = [
+                _project(self.table.by_key[key['customer_id']], request)
+                for key in request['Keys'] if key['customer_id'] in self.table.by_key
+            ]
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    def customer_names(self) -> List[tuple]:
+        return [(item['first_name'], item['last_name']) for item in self.table.items]
+
+
+class _BlandHandler(BaseHTTPRequestHandler):
+    delay = 0.2
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+        time.sleep(self.delay)
+        body = json.dumps({'status': 'success', 'call_id': 'fake-call'}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BlandStub:
+    """Local HTTP server answering Bland's /v1/calls endpoint after a configurable delay"""
+
+    def __init__(self, delay: float = 0.2):
+        handler = type('BlandHandler', (_BlandHandler,), {'delay': delay})
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
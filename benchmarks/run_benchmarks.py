@@ -0,0 +1,272 @@
+"""
+Offline benchmark harness: drives the chat pipeline against local fakes and writes JSON results.
+
+    python -m benchmarks.run_benchmarks --sessions 8 --output bench.json
+    python -m benchmarks.run_benchmarks --compare bench.json
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+from benchmarks.fakes import BlandStub, FakeDynamoDB, FakeModelStream, FakeRetriever
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of samples"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def summarize(samples: List[float]) -> Dict:
+    """Latency summary in milliseconds"""
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 50) * 1000,
+        'p95_ms': percentile(samples, 95) * 1000,
+        'p99_ms': percentile(samples, 99) * 1000,
+        'mean_ms': sum(samples) / len(samples) * 1000 if samples else 0.0,
+    }
+
+
+def timed_stream(chunks) -> tuple:
+    """Consume a response generator, returning (time to first chunk, total time)"""
+    start = time.perf_counter()
+    first = None
+    for _ in chunks:
+        if first is None:
+            first = time.perf_counter() - start
+    total = time.perf_counter() - start
+    return (first if first is not None else total), total
+
+
+def run_concurrent(sessions: int, requests_per_session: int, request: Callable[[int, int], tuple]) -> Dict:
+    """Run request(session, turn) across concurrent sessions, collecting latency, TTFT and throughput"""
+    latencies, ttfts = [], []
+
+    def session(session_id: int):
+        for turn in range(requests_per_session):
+            ttft, total = request(session_id, turn)
+            ttfts.append(ttft)
+            latencies.append(total)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        list(executor.map(session, range(sessions)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        'latency': summarize(latencies),
+        'ttft': summarize(ttfts),
+        'throughput_rps': len(latencies) / elapsed if elapsed else 0.0,
+        'sessions': sessions,
+    }
+
+
+def bench_rag(args) -> Dict:
+    import bedrock_utils
+
+    runtime = FakeModelStream(first_token_delay=args.ttft, chunk_delay=args.chunk_delay, chunks=args.chunks)
+    retriever = FakeRetriever(delay=args.retrieve_latency)
+
+    def request(session_id: int, turn: int):
+        # Unique prompts with the answer cache off measure the uncached path
+        prompt = f"Tell me about your maple spheres ({session_id}-{turn})"
+        return timed_stream(bedrock_utils.get_response_with_rag(
+            None, runtime, prompt, retriever=retriever, use_answer_cache=False
+        ))
+
+    return run_concurrent(args.sessions, args.requests, request)
+
+
+def bench_orders(args) -> Dict:
+    import dynamo_utils
+
+    dynamodb = FakeDynamoDB(customers=args.customers, orders_per_customer=args.orders, latency=args.dynamodb_latency)
+    names = dynamodb.customer_names()
+
+    def request(session_id: int, turn: int):
+        first_name, last_name = names[(session_id * args.requests + turn) % len(names)]
+        start = time.perf_counter()
+        dynamo_utils.get_customer_orders(dynamodb, first_name, last_name, use_cache=False)
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+
+    result = run_concurrent(args.sessions, args.requests, request)
+    result['dynamodb_requests'] = dynamodb.table.requests
+    return result
+
+
+def bench_customer_service(args) -> Dict:
+    # The shared dispatcher is created on first use; lift its rate limit so queued calls drain quickly
+    os.environ.setdefault('CALL_RATE_LIMIT_PER_MINUTE', '0')
+    import bedrock_utils
+
+    with BlandStub(delay=args.bland_latency) as stub:
+        os.environ['BLAND_BASE_URL'] = stub.base_url
+        results = {}
+        for mode, dispatch_async in (('sync', False), ('async', True)):
+            def request(session_id: int, turn: int):
+                phone = f"{mode == 'sync':d}55{session_id:03d}{turn:04d}"
+                start = time.perf_counter()
+                bedrock_utils.handle_customer_service_request(phone, dispatch_async=dispatch_async)
+                elapsed = time.perf_counter() - start
+                return elapsed, elapsed
+
+            results[mode] = run_concurrent(args.sessions, args.requests, request)
+
+        # Time for the background queue to finish placing every call after the chat has replied
+        dispatcher = bedrock_utils.get_call_dispatcher()
+        start = time.perf_counter()
+        while any(job.status not in ('placed', 'failed') for job in list(dispatcher.jobs.values())):
+            time.sleep(0.01)
+        results['async']['drain_ms'] = (time.perf_counter() - start) * 1000
+        results['async']['placed'] = sum(job.status == 'placed' for job in list(dispatcher.jobs.values()))
+    return results
+
+
+def bench_session_memory(args) -> Dict:
+    """Bytes held by one session's chat state after many turns, with history compaction applied"""
+    from history_utils import ChatArchive, compact_history
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = []
+    for _ in range(args.sessions):
+        messages, archive = [], ChatArchive()
+        for turn in range(args.turns):
+            messages.append({'role': 'user', 'content': f"Question {turn} about maple spheres?"})
+            messages.append({'role': 'assistant', 'content': "Our artisans love maple. " * args.chunks})
+            compact_history(messages, archive)
+        sessions.append((messages, archive))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    total = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    return {'turns': args.turns, 'bytes_per_session': total / max(args.sessions, 1)}
+
+
+def bench_api(args) -> Dict:
+    """SSE chat API under concurrent clients, served on a background event loop against the fakes"""
+    import asyncio
+    import http.client
+    import threading
+
+    from api_server import ChatServer
+    from session_store import MemorySessionStore
+
+    server = ChatServer(
+        None,
+        FakeModelStream(first_token_delay=args.ttft, chunk_delay=args.chunk_delay, chunks=args.chunks),
+        MemorySessionStore(),
+        dynamodb=FakeDynamoDB(customers=args.customers, orders_per_customer=args.orders, latency=args.dynamodb_latency),
+        retriever=FakeRetriever(delay=args.retrieve_latency),
+        # Every bench session connects from localhost, so tell sessions apart by X-Client-Id
+        trusted_proxies={'127.0.0.1'}
+    )
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    asyncio.run_coroutine_threadsafe(server.start('127.0.0.1', 0), loop).result()
+    rejected = {'count': 0}
+
+    def request(session_id: int, turn: int):
+        connection = http.client.HTTPConnection('127.0.0.1', server.port, timeout=60)
+        start = time.perf_counter()
+        connection.request('POST', '/chat', body=json.dumps({
+            'session_id': f"bench-{session_id}",
+            'message': f"Tell me about your maple spheres ({turn})"
+        }), headers={'Content-Type': 'application/json', 'X-Client-Id': f"client-{session_id}"})
+        response = connection.getresponse()
+        first = None
+        if response.status != 200:
+            rejected['count'] += 1
+        else:
+            for line in response:
+                if first is None and line.startswith(b'event: message'):
+                    first = time.perf_counter() - start
+        response.close()
+        connection.close()
+        total = time.perf_counter() - start
+        return (first if first is not None else total), total
+
+    try:
+        result = run_concurrent(args.sessions, args.requests, request)
+    finally:
+        loop.call_soon_threadsafe(server.shutdown)
+        loop.call_soon_threadsafe(loop.stop)
+    result['rejected'] = rejected['count']
+    return result
+
+
+BENCHMARKS = {
+    'rag': bench_rag,
+    'api': bench_api,
+    'orders': bench_orders,
+    'customer_service': bench_customer_service,
+    'session_memory': bench_session_memory,
+}
+
+
+def compare(current: Dict, baseline: Dict, prefix: str = "") -> None:
+    """Print numeric differences between two result trees"""
+    for key, value in current.items():
+        path = f"{prefix}{key}"
+        old = baseline.get(key) if isinstance(baseline, dict) else None
+        if isinstance(value, dict):
+            compare(value, old or {}, prefix=f"{path}.")
+        elif isinstance(value, (int, float)) and isinstance(old, (int, float)) and old:
+            print(f"{path:<55} {old:>12.2f} -> {value:>12.2f} ({(value - old) / old:+.1%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline chat pipeline benchmarks")
+    parser.add_argument('--only', choices=sorted(BENCHMARKS), action='append', help="run only these benchmarks")
+    parser.add_argument('--sessions', type=int, default=8, help="concurrent sessions")
+    parser.add_argument('--requests', type=int, default=10, help="requests per session")
+    parser.add_argument('--turns', type=int, default=200, help="chat turns per session for the memory benchmark")
+    parser.add_argument('--ttft', type=float, default=0.3, help="fake model time to first token (s)")
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help="fake model delay between chunks (s)")
+    parser.add_argument('--chunks', type=int, default=40, help="chunks per fake model answer")
+    parser.add_argument('--retrieve-latency', type=float, default=0.15, help="fake retrieve round trip (s)")
+    parser.add_argument('--customers', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=20, help="orders per customer")
+    parser.add_argument('--dynamodb-latency', type=float, default=0.02, help="fake DynamoDB request latency (s)")
+    parser.add_argument('--bland-latency', type=float, default=0.2, help="Bland stub response delay (s)")
+    parser.add_argument('--output', help="write results JSON here")
+    parser.add_argument('--compare', help="baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    results = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'args': vars(args),
+        }
+    }
+    for name in args.only or BENCHMARKS:
+        print(f"Running {name}...")
+        results[name] = BENCHMARKS[name](args)
+
+    print(json.dumps({key: value for key, value in results.items() if key != 'meta'}, indent=2))
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare({key: value for key, value in results.items() if key != 'meta'}, json.load(f))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for use in cache keys: lowercase with collapsed whitespace"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after ttl seconds.
+    With a weigher, eviction also keeps the summed entry weights under max_weight.
+    """
+
+    def __init__(self, max_size: int = 256, ttl: float = 300.0,
+                 max_weight: Optional[int] = None, weigher: Optional[Callable[[Any], int]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_weight = max_weight
+        self.weigher = weigher
+        self.weight = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the cached value, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def _weigh(self, value: Any) -> int:
+        return self.weigher(value) if self.weigher else 0
+
+    def _remove(self, key: Hashable) -> bool:
+        entry = self._data.pop(key, None)
+        if entry is None:
+            return False
+        self.weight -= self._weigh(entry[1])
+        return True
+
+    def _over_budget(self) -> bool:
+        if len(self._data) > self.max_size:
+            return True
+        return self.max_weight is not None and self.weight > self.max_weight
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Store a value, evicting least recently used entries while over budget"""
+        if self.max_size <= 0:
+            return
+        # A single value heavier than the whole budget would just evict everything
+        if self.max_weight is not None and self._weigh(value) > self.max_weight:
+            return
+        with self._lock:
+            self._remove(key)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self.weight += self._weigh(value)
+            while self._over_budget():
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable) -> bool:
+        """Remove a single entry, returning True if it was present"""
+        with self._lock:
+            return self._remove(key)
+
+    def clear(self) -> None:
+        """Remove every entry"""
+        with self._lock:
+            self._data.clear()
+            self.weight = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters for sizing the cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'max_size': self.max_size,
+            'weight': self.weight,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CallJob:
+    """Status of one queued customer-service call"""
+    __slots__ = ('job_id', 'phone_number', 'status', 'attempts', 'error', 'submissions', 'created_at', 'updated_at')
+
+    def __init__(self, phone_number: str):
+        self.job_id = uuid.uuid4().hex
+        self.phone_number = phone_number
+        self.status = 'queued'
+        self.attempts = 0
+        self.error = None
+        self.submissions = 1
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+
+    def to_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CallDispatcher:
+    """
+    Places calls on background threads so the chat can acknowledge immediately.
+    Repeat submissions for a number within dedupe_window reuse the existing job (counted in
+    job.submissions), dispatches are rate limited to rate_limit per minute, and connection
+    failures and 429/5xx responses back off and retry. Other errors, including read timeouts,
+    fail the job, since the call may already have been placed.
+    """
+
+    def __init__(self, send: Callable[[str], object], max_workers: int = 2, dedupe_window: float = 300.0,
+                 rate_limit: int = 30, max_attempts: int = 3, backoff: float = 1.0, retention: float = 3600.0):
+        self.send = send
+        self.dedupe_window = dedupe_window
+        self.min_interval = 60.0 / rate_limit if rate_limit > 0 else 0.0
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.retention = retention
+        self.jobs = {}
+        self._latest_by_phone = {}
+        self._next_dispatch = 0.0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='call-dispatch')
+
+    def submit(self, phone_number: str) -> CallJob:
+        """Queue a call, or return the recent job already queued for this number"""
+        with self._lock:
+            self._prune()
+            existing = self.jobs.get(self._latest_by_phone.get(phone_number))
+            if existing and existing.status != 'failed' and time.time() - existing.created_at < self.dedupe_window:
+                logger.info("Reusing call job %s for repeated submission", existing.job_id)
+                existing.submissions += 1
+                return existing
+
+            job = CallJob(phone_number)
+            self.jobs[job.job_id] = job
+            self._latest_by_phone[phone_number] = job.job_id
+
+        self._executor.submit(self._run, job)
+        return job
+
+    def get_job(self, job_id: str) -> Optional[CallJob]:
+        """Look up a job for status polling"""
+        return self.jobs.get(job_id)
+
+    def latest_job(self, phone_number: str) -> Optional[CallJob]:
+        """Return the most recent job for a phone number"""
+        return self.jobs.get(self._latest_by_phone.get(phone_number))
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.updated_at < cutoff]:
+            job = self.jobs.pop(job_id)
+            if self._latest_by_phone.get(job.phone_number) == job_id:
+                del self._latest_by_phone[job.phone_number]
+
+    def _wait_for_slot(self) -> None:
+        # Space dispatches at least min_interval apart across all workers
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_dispatch)
+            self._next_dispatch = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    def _set_status(self, job: CallJob, status: str, error: str = None) -> None:
+        job.status = status
+        job.error = error
+        job.updated_at = time.time()
+
+    def _run(self, job: CallJob) -> None:
+        for attempt in range(1, self.max_attempts + 1):
+            self._wait_for_slot()
+            self._set_status(job, 'dispatching')
+            job.attempts = attempt
+            try:
+                response = self.send(job.phone_number)
+                if response.status_code == 200:
+                    self._set_status(job, 'placed')
+                    logger.info("Call job %s placed after %s attempt(s)", job.job_id, attempt)
+                    return
+                error = f"HTTP {response.status_code}: {response.text}"
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+            except Exception as e:
+                error = str(e)
+                # Only a request that never reached Bland is safe to resend; ReadTimeout isn't a ConnectionError
+                retryable = isinstance(e, requests.exceptions.ConnectionError)
+
+            logger.error("Call job %s attempt %s failed: %s", job.job_id, attempt, error)
+            if not retryable or attempt == self.max_attempts:
+                self._set_status(job, 'failed', error)
+                return
+            self._set_status(job, 'retrying', error)
+            time.sleep(self.backoff * 2 ** (attempt - 1))
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+def dispatcher_settings() -> Dict:
+    """CallDispatcher keyword arguments from the environment"""
+    return {
+        'max_workers': int(os.getenv('CALL_QUEUE_WORKERS', '2')),
+        'dedupe_window': float(os.getenv('CALL_DEDUPE_WINDOW', '300')),
+        'rate_limit': int(os.getenv('CALL_RATE_LIMIT_PER_MINUTE', '30')),
+        'max_attempts': int(os.getenv('CALL_MAX_ATTEMPTS', '3'))
+    }
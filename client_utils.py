@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+
+import boto3
+import requests
+from botocore.config import Config
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+_settings_loaded = False
+
+
+def load_settings() -> None:
+    """Load .env.local into the environment once per process"""
+    global _settings_loaded
+    if not _settings_loaded:
+        load_dotenv('.env.local')
+        _settings_loaded = True
+
+
+# Load settings on import so module-level configuration elsewhere sees .env.local values
+load_settings()
+
+
+def aws_config() -> Config:
+    """botocore config with pooled keep-alive connections, timeouts and adaptive retries"""
+    return Config(
+        max_pool_connections=int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '50')),
+        connect_timeout=float(os.getenv('AWS_CONNECT_TIMEOUT', '5')),
+        read_timeout=float(os.getenv('AWS_READ_TIMEOUT', '60')),
+        tcp_keepalive=True,
+        retries={
+            'mode': os.getenv('AWS_RETRY_MODE', 'adaptive'),
+            'max_attempts': int(os.getenv('AWS_MAX_ATTEMPTS', '4'))
+        }
+    )
+
+
+def aws_credentials() -> dict:
+    """Explicit credentials and region from the environment for the Bedrock clients"""
+    return {
+        'aws_access_key_id': os.getenv('AWS_ACCESS_KEY_ID'),
+        'aws_secret_access_key': os.getenv('AWS_SECRET_ACCESS_KEY'),
+        'region_name': os.getenv('AWS_REGION', 'us-east-1')
+    }
+
+
+def _get_or_create(name: str, factory):
+    """Return the shared client called name, creating it on first use"""
+    client = _clients.get(name)
+    if client is None:
+        with _lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+                logger.info("Created shared %s client", name)
+    return client
+
+
+def get_bedrock_runtime():
+    """Shared bedrock-runtime client"""
+    return _get_or_create('bedrock-runtime', lambda: boto3.client(
+        service_name="bedrock-runtime",
+        config=aws_config(),
+        **aws_credentials()
+    ))
+
+
+def get_bedrock_agent_runtime():
+    """Shared bedrock-agent-runtime client for knowledge base operations"""
+    return _get_or_create('bedrock-agent-runtime', lambda: boto3.client(
+        service_name="bedrock-agent-runtime",
+        config=aws_config(),
+        **aws_credentials()
+    ))
+
+
+def get_dynamodb():
+    """Shared DynamoDB resource; DYNAMODB_ENDPOINT_URL points it at a local stand-in"""
+    def create():
+        kwargs = {'config': aws_config()}
+        endpoint_url = os.getenv('DYNAMODB_ENDPOINT_URL')
+        if endpoint_url:
+            kwargs['endpoint_url'] = endpoint_url
+        return boto3.resource('dynamodb', **kwargs)
+
+    return _get_or_create('dynamodb', create)
+
+
+def get_bland_session() -> requests.Session:
+    """Shared keep-alive HTTP session for the Bland API"""
+    def create():
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=int(os.getenv('BLAND_POOL_CONNECTIONS', '4')),
+            pool_maxsize=int(os.getenv('BLAND_POOL_MAXSIZE', '10'))
+        )
+        session.mount('https://', adapter)
+        session.headers.update({'Authorization': os.getenv('BLAND_API_KEY') or ''})
+        return session
+
+    return _get_or_create('bland', create)
+
+
+def bland_timeout() -> tuple:
+    """(connect, read) timeout in seconds for Bland API requests"""
+    return (
+        float(os.getenv('BLAND_CONNECT_TIMEOUT', '3')),
+        float(os.getenv('BLAND_READ_TIMEOUT', '15'))
+    )
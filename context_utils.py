@@ -0,0 +1,115 @@
+import logging
+import os
+import re
+from typing import Dict, List, Tuple
+
+from cache_utils import normalize_text
+from metrics_utils import metrics
+from retriever_utils import tokenize
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv('CONTEXT_TOKEN_BUDGET', '1500'))
+CONTEXT_DEDUP_THRESHOLD = float(os.getenv('CONTEXT_DEDUP_THRESHOLD', '0.8'))
+
+SENTENCE_PATTERN = re.compile(r"(?:[^.!?\n]|[.!?](?=\S))+(?:[.!?]+(?=\s|$)|\n|$)\s*")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for Claude models: about four characters per token"""
+    return (len(text) + 3) // 4
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences, keeping punctuation and trailing whitespace so joining them restores the text"""
+    return [sentence for sentence in SENTENCE_PATTERN.findall(text) if sentence.strip()]
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def trim_to_budget(text: str, max_tokens: int, cut_words: bool = True) -> str:
+    """
+    Keep whole leading sentences of text that fit in max_tokens.
+    When not even the first sentence fits it is cut at a word boundary, or with cut_words
+    False nothing is kept.
+    """
+    kept, used = [], 0
+    for sentence in split_sentences(text):
+        cost = estimate_tokens(sentence) + 1
+        if used + cost > max_tokens:
+            break
+        kept.append(sentence)
+        used += cost
+    if not kept and text and cut_words:
+        return text[:max(max_tokens, 0) * 4].rsplit(" ", 1)[0]
+    return "".join(kept).strip()
+
+
+def assemble_context(results: List[Dict], max_tokens: int = None,
+                     dedup_threshold: float = None) -> Tuple[str, Dict]:
+    """
+    Build the prompt context from retrieval results ({'text', 'score'}).
+    Passages are ranked by score, near-duplicates and sentences already included are dropped,
+    and the total is cut to max_tokens at a sentence boundary.
+    Returns the context and token stats for the request.
+    """
+    max_tokens = CONTEXT_TOKEN_BUDGET if max_tokens is None else max_tokens
+    dedup_threshold = CONTEXT_DEDUP_THRESHOLD if dedup_threshold is None else dedup_threshold
+
+    ranked = sorted(results, key=lambda result: result.get('score') or 0.0, reverse=True)
+    raw_tokens = sum(estimate_tokens(result['text']) for result in results)
+
+    kept, seen_terms, seen_sentences = [], [], set()
+    used = 0
+    duplicates = 0
+    for result in ranked:
+        terms = frozenset(tokenize(result['text']))
+        if any(jaccard(terms, previous) >= dedup_threshold for previous in seen_terms):
+            duplicates += 1
+            continue
+        seen_terms.append(terms)
+
+        # Overlapping sections repeat sentences verbatim; keep only the first copy
+        sentences = []
+        for sentence in split_sentences(result['text']):
+            key = normalize_text(sentence)
+            if key not in seen_sentences:
+                seen_sentences.add(key)
+                sentences.append(sentence)
+        passage = "".join(sentences).strip()
+        if not passage:
+            continue
+
+        remaining = max_tokens - used
+        cost = estimate_tokens(passage) + 1
+        if cost > remaining:
+            # Only the top passage may be cut mid-sentence; later ones end at a sentence or are dropped
+            passage = trim_to_budget(passage, remaining, cut_words=not kept)
+            if passage:
+                kept.append(passage)
+                used += estimate_tokens(passage) + 1
+            break
+        kept.append(passage)
+        used += cost
+
+    context = "\n".join(kept)
+    stats = {
+        'raw_tokens': raw_tokens,
+        'context_tokens': estimate_tokens(context),
+        'passages': len(results),
+        'kept_passages': len(kept),
+        'duplicates': duplicates,
+    }
+    stats['tokens_saved'] = max(0, stats['raw_tokens'] - stats['context_tokens'])
+
+    metrics.increment('context_tokens_saved_total', stats['tokens_saved'])
+    logger.info(
+        "context assembled passages=%d kept=%d duplicates=%d tokens=%d raw_tokens=%d tokens_saved=%d",
+        stats['passages'], stats['kept_passages'], stats['duplicates'],
+        stats['context_tokens'], stats['raw_tokens'], stats['tokens_saved']
+    )
+    return context, stats
@@ -1,26 +1,293 @@
+"""
+Convert the JSON knowledge base to text for Bedrock ingestion.
+
+    python convert_to_text.py input.json > output.txt
+    python convert_to_text.py input.json --out-dir kb_chunks --manifest kb_manifest.json
+
+With --out-dir the knowledge base is also split into one file per chunk and a manifest of
+per-chunk content hashes is kept, so later runs only write, and Bedrock only re-ingests,
+chunks that were added or changed, and delete files for chunks that disappeared.
+"""
+import argparse
+import hashlib
 import json
+import logging
+import os
+import re
 import sys
+import unicodedata
+from typing import Dict, Iterator, List, Tuple
+
+from context_utils import split_sentences
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = int(os.getenv('KB_CHUNK_SIZE', '1500'))
+CHUNK_OVERLAP = int(os.getenv('KB_CHUNK_OVERLAP', '200'))
+
+# UTF-8 text that was decoded as cp1252 starts multi-byte characters with these
+MOJIBAKE_PATTERN = re.compile("[\u00c2\u00c3\u00e2][\u0080-\u00bf\u0152\u0153\u0160\u0161\u0178\u017d\u017e\u02c6\u02dc\u2013-\u203a\u20ac\u2122]")
+INVISIBLE_PATTERN = re.compile("[\u200b\u200c\u200d\ufeff]")
+# Undecodable bytes kept by errors='surrogateescape'
+ESCAPED_BYTES_PATTERN = re.compile("[\udc80-\udcff]+")
+
+
+def normalize_encoding(text: str) -> str:
+    """Decode stray cp1252 bytes, repair mojibake, drop invisible characters and NFC-normalize"""
+    text = ESCAPED_BYTES_PATTERN.sub(
+        lambda match: match.group().encode('utf-8', 'surrogateescape').decode('cp1252', errors='replace'), text
+    )
+    if MOJIBAKE_PATTERN.search(text):
+        try:
+            text = text.encode('cp1252').decode('utf-8')
+        except UnicodeError:
+            pass
+    text = INVISIBLE_PATTERN.sub('', text).replace('\u00a0', ' ')
+    return unicodedata.normalize('NFC', text)
+
+
+def clean_content(content: str) -> str:
+    """Remove markdown emphasis and normalize encoding of one knowledge base entry"""
+    return normalize_encoding(content.replace('**', '').replace('*', ''))
+
 
-def convert_json_to_text(json_file):
+def iter_categories(json_file: str, read_size: int = 65536) -> Iterator[Tuple[str, List[str]]]:
+    """
+    Yield (category, entries) pairs from the top-level JSON object one category at a time,
+    so only the category being parsed is held in memory alongside the read buffer.
+    """
+    decoder = json.JSONDecoder()
+    # Bytes that aren't UTF-8 (cp1252 exports) survive decoding and are repaired by normalize_encoding
+    with open(json_file, 'r', encoding='utf-8-sig', errors='surrogateescape') as f:
+        buffer = ''
+        position = 0
+
+        def fill() -> bool:
+            nonlocal buffer, position
+            data = f.read(read_size)
+            buffer = buffer[position:] + data
+            position = 0
+            return bool(data)
+
+        def skip_whitespace() -> None:
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer) or not fill():
+                    return
+
+        def decode():
+            nonlocal position
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                    # A number or literal at the buffer edge may continue in the next read
+                    if end < len(buffer) or not fill():
+                        position = end
+                        return value
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+
+        skip_whitespace()
+        if buffer[position:position + 1] != '{':
+            raise ValueError(f"{json_file}: expected a JSON object of categories")
+        position += 1
+        while True:
+            skip_whitespace()
+            if buffer[position:position + 1] == '}':
+                return
+            category = decode()
+            skip_whitespace()
+            if buffer[position:position + 1] != ':':
+                raise ValueError(f"{json_file}: malformed category {category!r}")
+            position += 1
+            skip_whitespace()
+            entries = decode()
+            yield category, entries if isinstance(entries, list) else [entries]
+            skip_whitespace()
+            if buffer[position:position + 1] == ',':
+                position += 1
+
+
+def iter_kb_text(json_file: str) -> Iterator[str]:
+    """Yield the knowledge base in the category/entry text layout the retrievers expect"""
+    for category, contents in iter_categories(json_file):
+        yield f"\n### {normalize_encoding(category)}\n\n"
+        for content in contents:
+            yield clean_content(content)
+            yield "\n\n---\n\n"
+
+
+def convert_json_to_text(json_file, output=None):
     """Convert JSON knowledge base to plain text format for Bedrock ingestion"""
-    with open(json_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    # Process each category and its contents
-    for category, contents in data.items():
-        # Print category header
-        print(f"\n### {category}\n")
-        
-        # Print each content item with proper spacing
+    if output is None:
+        output = sys.stdout
+        # Windows consoles and redirects otherwise fall back to cp1252
+        if hasattr(output, 'reconfigure'):
+            output.reconfigure(encoding='utf-8')
+    for piece in iter_kb_text(json_file):
+        output.write(piece)
+
+
+def chunk_text(text: str, chunk_size: int = None, chunk_overlap: int = None) -> List[str]:
+    """Split text into chunks of at most chunk_size characters at sentence boundaries,
+    repeating up to chunk_overlap characters of trailing sentences at the start of the next chunk.
+    Sentences longer than chunk_size are split at chunk_size characters."""
+    chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    if chunk_size <= 0 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError(f"chunk_overlap ({chunk_overlap}) must be at least 0 and less than chunk_size ({chunk_size})")
+
+    pieces = (
+        sentence[start:start + chunk_size]
+        for sentence in split_sentences(text)
+        for start in range(0, len(sentence), chunk_size)
+    )
+    chunks, current, length = [], [], 0
+    for sentence in pieces:
+        if current and length + len(sentence) > chunk_size:
+            chunks.append("".join(current).strip())
+            # Carry trailing sentences into the next chunk, but only as many as leave room for this one
+            budget = min(chunk_overlap, chunk_size - len(sentence))
+            overlap, overlap_length = [], 0
+            for previous in reversed(current):
+                if overlap_length + len(previous) > budget:
+                    break
+                overlap.insert(0, previous)
+                overlap_length += len(previous)
+            current, length = overlap, overlap_length
+        current.append(sentence)
+        length += len(sentence)
+    if current and "".join(current).strip():
+        chunks.append("".join(current).strip())
+    return chunks
+
+
+def slugify(text: str, max_length: int = 48) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", text.lower()[:max_length]).strip("-") or "entry"
+
+
+def iter_chunks(json_file: str, chunk_size: int = None, chunk_overlap: int = None) -> Iterator[Dict]:
+    """
+    Yield {'id', 'category', 'text', 'hash'} chunks.
+    Ids come from the category and entry title rather than list position,
+    so inserting an entry doesn't renumber the chunks of every entry after it.
+    """
+    for category, contents in iter_categories(json_file):
+        category = normalize_encoding(category)
+        seen_titles = {}
         for content in contents:
-            # Remove any markdown formatting
-            clean_content = content.replace('**', '').replace('*', '')
-            print(clean_content)
-            print("\n---\n")  # Separator between entries
+            content = clean_content(content)
+            title = slugify(content.strip().split("\n", 1)[0])
+            seen_titles[title] = seen_titles.get(title, 0) + 1
+            entry_id = f"{slugify(category)}/{title}-{seen_titles[title]}"
+            for number, text in enumerate(chunk_text(content, chunk_size, chunk_overlap)):
+                yield {
+                    'id': f"{entry_id}/{number:03d}",
+                    'category': category,
+                    'text': text,
+                    'hash': hashlib.sha256(text.encode('utf-8')).hexdigest()
+                }
+
+
+def load_manifest(path: str) -> Dict:
+    if not path or not os.path.exists(path):
+        return {'chunks': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def chunk_filename(chunk_id: str) -> str:
+    return chunk_id.replace('/', '__') + '.txt'
+
+
+def sync_chunks(json_file: str, out_dir: str, manifest_path: str, chunk_size: int = None,
+                chunk_overlap: int = None, changes=None) -> Dict[str, List[str]]:
+    """
+    Write added and changed chunks to out_dir, remove deleted ones, and update the manifest.
+    Each change is also written as a JSON line to changes when given, for downstream re-indexing.
+    """
+    chunk_size = CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    previous = load_manifest(manifest_path)
+    old_chunks = previous.get('chunks', {})
+    new_chunks = {}
+    result = {'added': [], 'changed': [], 'deleted': [], 'unchanged': []}
+    os.makedirs(out_dir, exist_ok=True)
+
+    for chunk in iter_chunks(json_file, chunk_size, chunk_overlap):
+        filename = chunk_filename(chunk['id'])
+        new_chunks[chunk['id']] = {'hash': chunk['hash'], 'category': chunk['category'], 'file': filename}
+        old = old_chunks.get(chunk['id'])
+        if old and old['hash'] == chunk['hash'] and os.path.exists(os.path.join(out_dir, filename)):
+            result['unchanged'].append(chunk['id'])
+            continue
+
+        status = 'changed' if old else 'added'
+        result[status].append(chunk['id'])
+        with open(os.path.join(out_dir, filename), 'w', encoding='utf-8') as f:
+            f.write(f"### {chunk['category']}\n\n{chunk['text']}\n")
+        if changes is not None:
+            changes.write(json.dumps({'op': status, **chunk}, ensure_ascii=False) + "\n")
+
+    for chunk_id, old in old_chunks.items():
+        if chunk_id in new_chunks:
+            continue
+        result['deleted'].append(chunk_id)
+        path = os.path.join(out_dir, old['file'])
+        if os.path.exists(path):
+            os.remove(path)
+        if changes is not None:
+            changes.write(json.dumps({'op': 'deleted', 'id': chunk_id, 'hash': old['hash']}) + "\n")
+
+    # Write the manifest last so an interrupted run is simply redone next time
+    manifest = {'version': 1, 'chunk_size': chunk_size, 'chunk_overlap': chunk_overlap, 'chunks': new_chunks}
+    temp_path = f"{manifest_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(temp_path, manifest_path)
+
+    logger.info(
+        "Knowledge base sync: %d added, %d changed, %d deleted, %d unchanged",
+        len(result['added']), len(result['changed']), len(result['deleted']), len(result['unchanged'])
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert the JSON knowledge base for Bedrock ingestion")
+    parser.add_argument('input', help="knowledge base JSON file")
+    parser.add_argument('--output', help="write the full text here instead of stdout")
+    parser.add_argument('--out-dir', help="write one file per chunk here, only touching changed chunks")
+    parser.add_argument('--manifest', help="chunk hash manifest (default: <out-dir>/manifest.json)")
+    parser.add_argument('--changes', help="append added/changed/deleted chunks as JSON lines to this file")
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help="maximum characters per chunk")
+    parser.add_argument('--chunk-overlap', type=int, default=CHUNK_OVERLAP, help="characters repeated between chunks")
+    args = parser.parse_args()
+    if not 0 <= args.chunk_overlap < args.chunk_size:
+        parser.error("--chunk-overlap must be at least 0 and less than --chunk-size")
+
+    if args.out_dir:
+        logging.basicConfig(level=logging.INFO, format='%(message)s', stream=sys.stderr)
+        manifest = args.manifest or os.path.join(args.out_dir, 'manifest.json')
+        changes = open(args.changes, 'a', encoding='utf-8') if args.changes else None
+        try:
+            result = sync_chunks(args.input, args.out_dir, manifest, args.chunk_size, args.chunk_overlap, changes)
+        finally:
+            if changes is not None:
+                changes.close()
+        print(json.dumps({status: len(ids) for status, ids in result.items()}), file=sys.stderr)
+        if not args.output:
+            return
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            convert_json_to_text(args.input, f)
+    else:
+        convert_json_to_text(args.input)
+
 
 if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python convert_to_text.py input.json > output.txt")
-        sys.exit(1)
-    
-    convert_json_to_text(sys.argv[1])
+    main()
@@ -0,0 +1,151 @@
+import difflib
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from dynamo_utils import make_name_key, scan_customer_names
+
+logger = logging.getLogger(__name__)
+
+
+class BloomFilter:
+    """Compact probabilistic set: no false negatives, tunable false-positive rate"""
+
+    def __init__(self, capacity: int = 10000, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        # Double hashing: derive k bit positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(value.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, value: str) -> None:
+        """Add a value to the filter"""
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+
+class CustomerNameIndex:
+    """
+    In-memory index of customer names used to skip DynamoDB for names that definitely don't exist.
+    Fails open: until the first successful load every name is treated as possibly known.
+    Misses are trusted between refreshes: a customer written since the last refresh is unknown
+    until add() records it or the next refresh, so refresh_interval bounds how stale a miss can be.
+    """
+
+    def __init__(self, dynamodb, capacity: int = 100000, error_rate: float = 0.001,
+                 refresh_interval: float = 300.0, fuzzy: bool = True, max_retry_interval: float = 60.0):
+        self.dynamodb = dynamodb
+        self.refresh_interval = refresh_interval
+        self.max_retry_interval = max_retry_interval
+        self.fuzzy = fuzzy
+        self.bloom = BloomFilter(capacity=capacity, error_rate=error_rate)
+        # Display names by normalized key, only kept when fuzzy matching is enabled
+        self.names = {}
+        # Normalized keys by the first letters of the last name, to bound fuzzy matching
+        self.buckets = {}
+        self.loaded = False
+        self.last_refresh = 0.0
+        self.next_refresh = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def add(self, first_name: str, last_name: str) -> None:
+        """Record a customer name; call this whenever a customer is written"""
+        key = make_name_key(first_name, last_name)
+        with self._lock:
+            if key not in self.bloom:
+                self.bloom.add(key)
+            if self.fuzzy and key not in self.names:
+                self.names[key] = (first_name.title(), last_name.title())
+                self.buckets.setdefault(_bucket(key), []).append(key)
+
+    def refresh(self) -> None:
+        """Scan customer names from DynamoDB and add any not yet indexed"""
+        try:
+            added = 0
+            for first_name, last_name in scan_customer_names(self.dynamodb):
+                self.add(first_name, last_name)
+                added += 1
+            self.loaded = True
+            self.failures = 0
+            self.last_refresh = time.monotonic()
+            self.next_refresh = self.last_refresh + self.refresh_interval
+            logger.info("Customer name index refreshed with %s names", added)
+        except Exception as e:
+            # Back off exponentially so a failing table isn't rescanned on every lookup
+            self.failures += 1
+            delay = min(self.max_retry_interval, self.refresh_interval, 2 ** self.failures)
+            self.next_refresh = time.monotonic() + delay
+            logger.error("Failed to refresh customer name index, retrying in %.0fs: %s", delay, e, exc_info=True)
+        finally:
+            self._refreshing = False
+
+    def maybe_refresh(self) -> None:
+        """Refresh in a background thread once the index is older than refresh_interval"""
+        with self._lock:
+            if self._refreshing or time.monotonic() < self.next_refresh:
+                return
+            self._refreshing = True
+        threading.Thread(target=self.refresh, daemon=True).start()
+
+    def might_contain(self, first_name: str, last_name: str) -> bool:
+        """False only when the customer definitely isn't in the table"""
+        self.maybe_refresh()
+        if not self.loaded:
+            return True
+        return make_name_key(first_name, last_name) in self.bloom
+
+    def closest_match(self, first_name: str, last_name: str, cutoff: float = 0.85) -> Optional[Tuple[str, str]]:
+        """Return the nearest known customer name for a near-miss spelling, if any"""
+        if not self.fuzzy or not self.names:
+            return None
+        key = make_name_key(first_name, last_name)
+        # Only compare against names sharing the last name's first letters; a typo there is rare
+        with self._lock:
+            keys = list(self.buckets.get(_bucket(key), ()))
+        matches = difflib.get_close_matches(key, keys, n=1, cutoff=cutoff)
+        return self.names[matches[0]] if matches else None
+
+    def resolve(self, first_name: str, last_name: str) -> Optional[Tuple[str, str]]:
+        """
+        Map a requested name to one worth looking up in DynamoDB.
+        Returns the name itself, a fuzzy correction, or None when it is definitely unknown.
+        """
+        if self.might_contain(first_name, last_name):
+            return first_name, last_name
+        return self.closest_match(first_name, last_name)
+
+
+def _bucket(key: str, prefix: int = 2) -> str:
+    """Fuzzy-match bucket for a 'last#first' key"""
+    return key[:prefix]
+
+
+def init_customer_index(dynamodb) -> Optional[CustomerNameIndex]:
+    """Build the customer name index unless CUSTOMER_NAME_INDEX_ENABLED is 'false'"""
+    if os.getenv('CUSTOMER_NAME_INDEX_ENABLED', 'true').lower() == 'false':
+        return None
+    index = CustomerNameIndex(
+        dynamodb,
+        refresh_interval=float(os.getenv('CUSTOMER_NAME_INDEX_REFRESH', '300')),
+        max_retry_interval=float(os.getenv('CUSTOMER_NAME_INDEX_RETRY', '60')),
+        fuzzy=os.getenv('CUSTOMER_NAME_FUZZY', 'true').lower() != 'false'
+    )
+    index.maybe_refresh()
+    return index
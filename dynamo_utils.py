@@ -1,92 +1,378 @@
 import logging
-from typing import Optional, List, Dict
-import boto3
-from boto3.dynamodb.conditions import Attr
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Dict, Tuple
+from boto3.dynamodb.conditions import Attr, Key
 from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
 from datetime import datetime
+from cache_utils import TTLCache
+from client_utils import get_dynamodb
+from metrics_utils import metrics, span
 
 logger = logging.getLogger(__name__)
 deserializer = TypeDeserializer()
 
+CUSTOMER_TABLE = os.getenv('CUSTOMER_TABLE', 'Rivertownball-cus')
+NAME_INDEX = os.getenv('CUSTOMER_NAME_INDEX', 'name_key-index')
+NAME_KEY_ATTRIBUTE = 'name_key'
+
+# Set once every customer item carries name_key (backfill done and all writers set it);
+# until then an empty index query is confirmed with a scan
+NAME_INDEX_COMPLETE = os.getenv('CUSTOMER_NAME_INDEX_COMPLETE', 'false').lower() == 'true'
+# Seconds to wait before trying an index that was missing or still building
+NAME_INDEX_RETRY = float(os.getenv('CUSTOMER_NAME_INDEX_RETRY', '300'))
+
+# Monotonic time before which the name index is skipped after it was found unavailable
+_name_index_retry_at = 0.0
+
+# Processed order lists keyed by normalized customer name, bounded by total orders held
+order_cache = TTLCache(
+    max_size=int(os.getenv('ORDER_CACHE_SIZE', '1024')),
+    ttl=float(os.getenv('ORDER_CACHE_TTL', '300')),
+    max_weight=int(os.getenv('ORDER_CACHE_MAX_ORDERS', '50000')),
+    weigher=lambda orders: len(orders) + 1
+)
+
+metrics.register_gauge('order_cache_entries', lambda: len(order_cache))
+metrics.register_gauge('order_cache_hit_rate', lambda: order_cache.stats()['hit_rate'])
+
+# Primary keys of customers seen so far, keyed by normalized name, for BatchGetItem lookups
+customer_keys = TTLCache(max_size=int(os.getenv('CUSTOMER_KEY_CACHE_SIZE', '10000')), ttl=86400.0)
+_key_names = {}
+
 def init_dynamodb():
-    """Initialize and return a DynamoDB resource"""
+    """
+    Return the shared DynamoDB resource, created on first use.
+    Set DYNAMODB_ENDPOINT_URL to point at a local DynamoDB stand-in.
+    """
     try:
-        dynamodb = boto3.resource('dynamodb')
+        dynamodb = get_dynamodb()
         logger.info("DynamoDB client initialized successfully")
         return dynamodb
     except Exception as e:
-        logger.error(f"Failed to initialize DynamoDB client: {e}", exc_info=True)
+        logger.error("Failed to initialize DynamoDB client: %s", e, exc_info=True)
         raise
 
-def get_customer_orders(dynamodb, first_name: str, last_name: str) -> Optional[List[Dict]]:
+def make_name_key(first_name: str, last_name: str) -> str:
+    """Build the normalized 'last#first' key stored on customer items for the name index"""
+    return f"{last_name.strip().lower()}#{first_name.strip().lower()}"
+
+def order_projection(table) -> Dict:
+    """Projection kwargs that fetch only the attributes order rendering needs"""
+    attribute_names = {
+        f"#p{i}": name
+        for i, name in enumerate(dict.fromkeys(table_key_names(table) + ['first_name', 'last_name', 'orders']))
+    }
+    return {
+        'ProjectionExpression': ', '.join(attribute_names),
+        'ExpressionAttributeNames': attribute_names
+    }
+
+def query_customers_by_name(table, first_name: str, last_name: str) -> List[Dict]:
+    """Query the name index for customers, following LastEvaluatedKey across pages"""
+    items = []
+    query_kwargs = {
+        'IndexName': NAME_INDEX,
+        'KeyConditionExpression': Key(NAME_KEY_ATTRIBUTE).eq(make_name_key(first_name, last_name)),
+        **order_projection(table)
+    }
+    while True:
+        response = table.query(**query_kwargs)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return items
+        query_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def scan_customers_by_name(table, first_name: str, last_name: str) -> List[Dict]:
+    """Scan for customers by exact name, following LastEvaluatedKey until a match is found"""
+    scan_kwargs = {
+        'FilterExpression': Attr('first_name').eq(first_name) & Attr('last_name').eq(last_name),
+        **order_projection(table)
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        items = response.get('Items', [])
+        if items or 'LastEvaluatedKey' not in response:
+            return items
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def find_customers(table, first_name: str, last_name: str) -> List[Dict]:
+    """
+    Look customers up through the name index, falling back to a paginated scan when the index
+    is unavailable, or when it finds nothing and may not cover every item yet
+    """
+    global _name_index_retry_at
+
+    if time.monotonic() >= _name_index_retry_at:
+        try:
+            with span('dynamodb_lookup', method='query'):
+                items = query_customers_by_name(table, first_name, last_name)
+            if items or NAME_INDEX_COMPLETE:
+                return items
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') not in ('ValidationException', 'ResourceNotFoundException'):
+                raise
+            # Missing or still backfilling; try it again after a cooldown
+            logger.warning("Name index %s unavailable, scanning for %.0fs: %s", NAME_INDEX, NAME_INDEX_RETRY, e)
+            _name_index_retry_at = time.monotonic() + NAME_INDEX_RETRY
+
+    with span('dynamodb_lookup', method='scan'):
+        return scan_customers_by_name(table, first_name, last_name)
+
+def scan_customer_names(dynamodb, table_name: str = CUSTOMER_TABLE):
+    """Yield (first_name, last_name) for every customer, fetching only the name attributes"""
+    table = dynamodb.Table(table_name)
+    scan_kwargs = {
+        'ProjectionExpression': '#fn, #ln',
+        'ExpressionAttributeNames': {'#fn': 'first_name', '#ln': 'last_name'}
+    }
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if 'first_name' in item and 'last_name' in item:
+                yield item['first_name'], item['last_name']
+        if 'LastEvaluatedKey' not in response:
+            return
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def invalidate_customer_orders(first_name: str, last_name: str) -> None:
+    """Drop a customer's cached orders; call this whenever one of their orders is written"""
+    order_cache.invalidate(make_name_key(first_name, last_name))
+
+def order_cache_stats() -> Dict:
+    """Return order cache size and hit-rate metrics"""
+    return order_cache.stats()
+
+def get_customer_orders(dynamodb, first_name: str, last_name: str, use_cache: bool = True) -> Optional[List[Dict]]:
+    """
+    Retrieve customer orders by customer name, reading through order_cache
+    Returns None if customer not found
+    """
+    cache_key = make_name_key(first_name, last_name)
+    if use_cache:
+        cached_orders = order_cache.get(cache_key)
+        if cached_orders is not None:
+            logger.info("Order cache hit for %s %s", first_name, last_name)
+            metrics.increment('order_lookups_total', result='cache_hit')
+            return [dict(order) for order in cached_orders]
+    
+    with span('order_lookup'):
+        orders = fetch_customer_orders(dynamodb, first_name, last_name)
+    metrics.increment('order_lookups_total', result='found' if orders is not None else 'not_found')
+    
+    # Misses and errors both come back as None, so only found customers are cached
+    if use_cache and orders is not None:
+        order_cache.set(cache_key, tuple(dict(order) for order in orders))
+    return orders
+
+def fetch_customer_orders(dynamodb, first_name: str, last_name: str) -> Optional[List[Dict]]:
     """
     Retrieve customer orders from DynamoDB by customer name
     Returns None if customer not found
     """
-    table = dynamodb.Table('Rivertownball-cus')
+    table = dynamodb.Table(CUSTOMER_TABLE)
     
     try:
         # Convert input names to title case for consistency
         first_name = first_name.title()
         last_name = last_name.title()
         
-        logger.info(f"Querying DynamoDB for {first_name} {last_name}")
+        logger.info("Querying DynamoDB for %s %s", first_name, last_name)
         
-        response = table.scan(
-            FilterExpression='#fn = :fn and #ln = :ln',
-            ExpressionAttributeNames={
-                '#fn': 'first_name',
-                '#ln': 'last_name'
-            },
-            ExpressionAttributeValues={
-                ':fn': first_name,
-                ':ln': last_name
-            }
-        )
-        
-        logger.debug(f"Raw DynamoDB response: {response}")
+        items = find_customers(table, first_name, last_name)
         
-        items = response.get('Items', [])
-        logger.info(f"Found {len(items)} matching customers")
+        logger.info("Found %s matching customers", len(items))
         
         if not items:
             logger.info("No customer found")
             return None
             
         customer = items[0]
-        logger.debug(f"Customer data: {customer}")
+        logger.debug("Customer data: %s", customer)
+        remember_customer_key(table, first_name, last_name, customer)
         
-        orders = []
-        if 'orders' in customer:
-            order_list = customer['orders']
-            logger.debug(f"Raw orders data: {order_list}")
-            
-            for order in order_list:
-                try:
-                    # Convert date to more readable format
-                    date_obj = datetime.strptime(order['order_date'], '%Y-%m-%d')
-                    formatted_date = date_obj.strftime('%B %d, %Y')
-                    
-                    processed_order = {
-                        'order_id': order['order_id'],
-                        'product': order['product'],
-                        'quantity': int(order['quantity']),
-                        'order_date': formatted_date,
-                        'total_price': float(order['total_price'])
-                    }
-                    logger.debug(f"Processed order: {processed_order}")
-                    orders.append(processed_order)
-                except Exception as e:
-                    logger.error(f"Error processing order: {e}")
-                    logger.error(f"Problem order data: {order}")
-                    continue
-            
-            logger.info(f"Successfully processed {len(orders)} orders")
-            return orders
-        
-        logger.info("No orders found in customer record")
-        return []
+        with span('order_processing'):
+            return process_customer_orders(customer)
         
     except Exception as e:
-        logger.error(f"Error querying DynamoDB: {e}", exc_info=True)
+        logger.error("Error querying DynamoDB: %s", e, exc_info=True)
         return None
+
+def process_customer_orders(customer: Dict) -> List[Dict]:
+    """Convert the raw orders on a customer item into display-ready dicts"""
+    orders = []
+    if 'orders' in customer:
+        order_list = customer['orders']
+        logger.debug("Raw orders data: %s", order_list)
+        
+        for order in order_list:
+            try:
+                # Convert date to more readable format
+                date_obj = datetime.strptime(order['order_date'], '%Y-%m-%d')
+                formatted_date = date_obj.strftime('%B %d, %Y')
+                
+                processed_order = {
+                    'order_id': order['order_id'],
+                    'product': order['product'],
+                    'quantity': int(order['quantity']),
+                    'order_date': formatted_date,
+                    'total_price': float(order['total_price'])
+                }
+                logger.debug("Processed order: %s", processed_order)
+                orders.append(processed_order)
+            except Exception as e:
+                logger.error("Error processing order: %s", e)
+                logger.error("Problem order data: %s", order)
+                continue
+        
+        logger.info("Successfully processed %s orders", len(orders))
+        return orders
+    
+    logger.info("No orders found in customer record")
+    return []
+
+def table_key_names(table) -> List[str]:
+    """Return the primary key attribute names of a table, describing it only once"""
+    if table.name not in _key_names:
+        _key_names[table.name] = [key['AttributeName'] for key in table.key_schema]
+    return _key_names[table.name]
+
+def remember_customer_key(table, first_name: str, last_name: str, customer: Dict) -> None:
+    """Record a customer's primary key so later bulk lookups can use BatchGetItem"""
+    key_names = table_key_names(table)
+    if all(name in customer for name in key_names):
+        customer_keys.set(make_name_key(first_name, last_name), {name: customer[name] for name in key_names})
+
+def batch_get_customers(dynamodb, keys: List[Dict], max_attempts: int = 5) -> List[Dict]:
+    """
+    Fetch customer items by primary key with BatchGetItem, 100 keys per request.
+    Only the attributes order rendering needs are fetched; unprocessed keys are retried with
+    exponential backoff.
+    """
+    items = []
+    projection = order_projection(dynamodb.Table(CUSTOMER_TABLE))
+    for start in range(0, len(keys), 100):
+        request = {CUSTOMER_TABLE: {'Keys': keys[start:start + 100], **projection}}
+        for attempt in range(max_attempts):
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(CUSTOMER_TABLE, []))
+            request = response.get('UnprocessedKeys') or {}
+            if not request:
+                break
+            time.sleep(min(0.05 * 2 ** attempt, 1.0))
+        if request:
+            logger.warning("Giving up on %s unprocessed keys", len(request[CUSTOMER_TABLE]['Keys']))
+    return items
+
+def get_orders_for_customers(dynamodb, names: List[Tuple[str, str]], use_cache: bool = True) -> Dict[Tuple[str, str], Optional[List[Dict]]]:
+    """
+    Retrieve orders for several customers at once.
+    Cached customers are served from order_cache, customers with known primary keys come back in
+    one BatchGetItem call, and the rest are looked up by name in parallel.
+    Returns orders (or None when not found) keyed by the requested (first_name, last_name).
+    """
+    results = {}
+    pending = {}
+    for first_name, last_name in names:
+        cache_key = make_name_key(first_name, last_name)
+        cached_orders = order_cache.get(cache_key) if use_cache else None
+        if cached_orders is not None:
+            results[(first_name, last_name)] = [dict(order) for order in cached_orders]
+        else:
+            pending[cache_key] = (first_name, last_name)
+
+    # 1. Customers whose primary key we already know: one batched round trip
+    known_keys = {cache_key: customer_keys.get(cache_key) for cache_key in pending}
+    known_keys = {cache_key: key for cache_key, key in known_keys.items() if key is not None}
+    if known_keys:
+        try:
+            for customer in batch_get_customers(dynamodb, list(known_keys.values())):
+                cache_key = make_name_key(customer.get('first_name', ''), customer.get('last_name', ''))
+                if cache_key not in pending:
+                    continue
+                orders = process_customer_orders(customer)
+                results[pending.pop(cache_key)] = orders
+                if use_cache:
+                    order_cache.set(cache_key, tuple(dict(order) for order in orders))
+        except Exception as e:
+            logger.error("Batch customer lookup failed, falling back to name lookups: %s", e, exc_info=True)
+
+    # 2. Everyone else: name lookups issued concurrently
+    if pending:
+        with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+            futures = {
+                name: executor.submit(get_customer_orders, dynamodb, name[0], name[1], use_cache)
+                for name in pending.values()
+            }
+            for name, future in futures.items():
+                results[name] = future.result()
+
+    return results
+
+def create_name_index(dynamodb, table_name: str = CUSTOMER_TABLE) -> None:
+    """Add the name_key global secondary index to the customer table if it is missing"""
+    table = dynamodb.Table(table_name)
+    existing = [index['IndexName'] for index in (table.global_secondary_indexes or [])]
+    if NAME_INDEX in existing:
+        logger.info("Index %s already exists on %s", NAME_INDEX, table_name)
+        return
+
+    index = {
+        'IndexName': NAME_INDEX,
+        'KeySchema': [{'AttributeName': NAME_KEY_ATTRIBUTE, 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'ALL'}
+    }
+    # Provisioned tables need explicit throughput on the new index
+    billing_mode = (table.billing_mode_summary or {}).get('BillingMode', 'PROVISIONED')
+    if billing_mode == 'PROVISIONED':
+        throughput = table.provisioned_throughput
+        index['ProvisionedThroughput'] = {
+            'ReadCapacityUnits': throughput['ReadCapacityUnits'],
+            'WriteCapacityUnits': throughput['WriteCapacityUnits']
+        }
+
+    table.update(
+        AttributeDefinitions=[{'AttributeName': NAME_KEY_ATTRIBUTE, 'AttributeType': 'S'}],
+        GlobalSecondaryIndexUpdates=[{'Create': index}]
+    )
+    logger.info("Creating index %s on %s", NAME_INDEX, table_name)
+
+def backfill_name_keys(dynamodb, table_name: str = CUSTOMER_TABLE) -> int:
+    """
+    Populate name_key on existing customer items so the name index covers them.
+    Returns the number of items updated.
+    """
+    table = dynamodb.Table(table_name)
+    key_names = [key['AttributeName'] for key in table.key_schema]
+
+    # Only fetch the attributes needed to compute and write the key
+    attribute_names = {f"#a{i}": name for i, name in enumerate(key_names + ['first_name', 'last_name', NAME_KEY_ATTRIBUTE])}
+    scan_kwargs = {
+        'ProjectionExpression': ', '.join(attribute_names),
+        'ExpressionAttributeNames': attribute_names
+    }
+
+    updated = 0
+    while True:
+        response = table.scan(**scan_kwargs)
+        for item in response.get('Items', []):
+            if 'first_name' not in item or 'last_name' not in item:
+                continue
+            name_key = make_name_key(item['first_name'], item['last_name'])
+            if item.get(NAME_KEY_ATTRIBUTE) == name_key:
+                continue
+            table.update_item(
+                Key={name: item[name] for name in key_names},
+                UpdateExpression='SET #nk = :nk',
+                ExpressionAttributeNames={'#nk': NAME_KEY_ATTRIBUTE},
+                ExpressionAttributeValues={':nk': name_key}
+            )
+            updated += 1
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    logger.info("Backfilled %s on %s items in %s", NAME_KEY_ATTRIBUTE, updated, table_name)
+    return updated
@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import tempfile
+import time
+import weakref
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+from context_utils import estimate_tokens, split_sentences
+
+logger = logging.getLogger(__name__)
+
+CHAT_HISTORY_WINDOW = int(os.getenv('CHAT_HISTORY_WINDOW', '20'))
+MEMORY_TOKEN_BUDGET = int(os.getenv('MEMORY_TOKEN_BUDGET', '600'))
+MEMORY_SUMMARY_TOKENS = int(os.getenv('MEMORY_SUMMARY_TOKENS', '200'))
+# Spill files untouched for this long belong to sessions that have ended, like idle sessions in the store
+CHAT_SPILL_TTL = float(os.getenv('CHAT_SPILL_TTL', os.getenv('SESSION_TTL', '86400')))
+
+# Speaker labels used in prompts; "Human:"/"Assistant:" are reserved for the model's own turn markers
+MEMORY_LABELS = {'user': 'Customer', 'assistant': 'Specialist'}
+
+
+class ArchivedMessage:
+    """Compact record of a chat turn evicted from the inline history window"""
+    __slots__ = ('role', 'preview', 'offset')
+
+    def __init__(self, role: str, preview: str, offset: Optional[int] = None):
+        self.role = role
+        self.preview = preview
+        # Byte offset of the full message in the spill file, if spilling is enabled
+        self.offset = offset
+
+
+class ChatArchive:
+    """
+    Holds turns evicted from the inline window as previews, keeping at most max_records.
+    With spill_dir set, full message text is appended to a JSONL file there and read back on demand.
+    The file is deleted by clear(), close() or when the archive is garbage collected with its
+    session; files left behind by a crash are removed once idle for spill_ttl.
+    """
+
+    def __init__(self, max_records: int = 500, preview_chars: int = 120, spill_dir: Optional[str] = None,
+                 spill_ttl: float = CHAT_SPILL_TTL):
+        self.preview_chars = preview_chars
+        self.records = deque(maxlen=max_records)
+        self.spill_dir = spill_dir or os.getenv('CHAT_SPILL_DIR')
+        self.spill_path = None
+        self._finalizer = None
+        if self.spill_dir:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            remove_stale_spill_files(self.spill_dir, spill_ttl)
+
+    def _open_spill_file(self) -> None:
+        fd, self.spill_path = tempfile.mkstemp(prefix='chat-', suffix='.jsonl', dir=self.spill_dir)
+        os.close(fd)
+        self._finalizer = weakref.finalize(self, _remove_file, self.spill_path)
+
+    def add(self, message: Dict) -> None:
+        """Archive a message as a compact record, spilling the full text if enabled"""
+        content = message.get('content', '')
+        preview = content if len(content) <= self.preview_chars else content[:self.preview_chars].rstrip() + "…"
+
+        offset = None
+        if self.spill_dir:
+            if self.spill_path is None:
+                self._open_spill_file()
+            with open(self.spill_path, 'ab') as f:
+                offset = f.tell()
+                f.write(json.dumps(message).encode('utf-8') + b"\n")
+
+        self.records.append(ArchivedMessage(message.get('role', 'assistant'), preview, offset))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def page(self, page: int = 1, page_size: int = 10) -> List[ArchivedMessage]:
+        """Return a page of archived records, page 1 being the most recently archived"""
+        end = len(self.records) - (page - 1) * page_size
+        start = max(0, end - page_size)
+        return [self.records[i] for i in range(start, max(start, end))]
+
+    def load(self, record: ArchivedMessage) -> str:
+        """Return the full text of an archived message, or its preview when it wasn't spilled"""
+        if record.offset is None or not self.spill_path:
+            return record.preview
+        try:
+            with open(self.spill_path, 'rb') as f:
+                f.seek(record.offset)
+                return json.loads(f.readline()).get('content', '')
+        except (OSError, ValueError):
+            return record.preview
+
+    def clear(self) -> None:
+        """Drop all records and delete the spill file"""
+        self.records.clear()
+        self.close()
+
+    def close(self) -> None:
+        """Delete the spill file; a later add() starts a new one"""
+        if self._finalizer is not None:
+            self._finalizer()
+        self.spill_path = None
+        self._finalizer = None
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def remove_stale_spill_files(spill_dir: str, ttl: float = CHAT_SPILL_TTL) -> int:
+    """Delete spill files not written to for ttl seconds; returns how many were removed"""
+    cutoff = time.time() - ttl
+    removed = 0
+    for entry in os.scandir(spill_dir):
+        if entry.name.startswith('chat-') and entry.name.endswith('.jsonl'):
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.remove(entry.path)
+                    removed += 1
+            except FileNotFoundError:
+                continue
+    if removed:
+        logger.info("Removed %d stale chat spill files", removed)
+    return removed
+
+
+def compact_history(messages: List[Dict], archive: ChatArchive, window: int = CHAT_HISTORY_WINDOW) -> None:
+    """Move messages beyond the most recent window into the archive, in place"""
+    overflow = len(messages) - window
+    if overflow <= 0:
+        return
+    for message in messages[:overflow]:
+        archive.add(message)
+    del messages[:overflow]
+    logger.debug("Archived %s messages, %s archived in total", overflow, len(archive))
+
+
+def summarize_turn(role: str, content: str, max_chars: int = 160) -> str:
+    """One-line extractive summary of a turn: its speaker and first sentence"""
+    sentences = split_sentences(content.strip())
+    first = " ".join(sentences[0].split()) if sentences else ""
+    if len(first) > max_chars:
+        first = first[:max_chars].rsplit(" ", 1)[0] + "…"
+    return f"{MEMORY_LABELS.get(role, role.title())}: {first}"
+
+
+class ConversationMemory:
+    """
+    Conversation context for the model, bounded in tokens however long the chat runs.
+    Recent turns are kept verbatim within token_budget; older turns are folded into a running
+    summary one at a time as they fall out, and the oldest summary lines are dropped past summary_tokens.
+    A custom summarizer(role, content) -> line can replace the extractive default.
+    """
+
+    def __init__(self, token_budget: int = None, summary_tokens: int = None,
+                 summarizer: Callable[[str, str], str] = summarize_turn):
+        self.token_budget = MEMORY_TOKEN_BUDGET if token_budget is None else token_budget
+        self.summary_tokens = MEMORY_SUMMARY_TOKENS if summary_tokens is None else summary_tokens
+        self.summarizer = summarizer
+        self.turns = deque()
+        self.turn_tokens = 0
+        self.summary = deque()
+        self.summary_token_count = 0
+
+    def add(self, role: str, content: str) -> None:
+        """Record a completed turn, folding the oldest turns into the summary when over budget"""
+        # Blank lines would let history text imitate the model's turn markers
+        content = "\n".join(line for line in content.strip().splitlines() if line.strip())
+        if not content:
+            return
+        tokens = estimate_tokens(content)
+        self.turns.append((role, content, tokens))
+        self.turn_tokens += tokens
+        while self.turn_tokens > self.token_budget and self.turns:
+            self._fold(*self.turns.popleft())
+
+    def _fold(self, role: str, content: str, tokens: int) -> None:
+        self.turn_tokens -= tokens
+        line = self.summarizer(role, content)
+        line_tokens = estimate_tokens(line) + 1
+        self.summary.append((line, line_tokens))
+        self.summary_token_count += line_tokens
+        while self.summary_token_count > self.summary_tokens and self.summary:
+            self.summary_token_count -= self.summary.popleft()[1]
+
+    def render(self) -> str:
+        """Prompt text for the conversation so far, empty before the first turn"""
+        parts = []
+        if self.summary:
+            parts.append("Earlier in the conversation:\n" + "\n".join(line for line, _ in self.summary))
+        if self.turns:
+            parts.append("Recent conversation:\n" + "\n".join(
+                f"{MEMORY_LABELS.get(role, role.title())}: {content}" for role, content, _ in self.turns
+            ))
+        return "\n\n".join(parts)
+
+    def token_count(self) -> int:
+        return self.turn_tokens + self.summary_token_count
+
+    def clear(self) -> None:
+        self.turns.clear()
+        self.summary.clear()
+        self.turn_tokens = 0
+        self.summary_token_count = 0
@@ -0,0 +1,145 @@
+import re
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Phrases that send a chat into the customer service flow
+CS_KEYWORDS = (
+    'speak to someone',
+    'talk to a person',
+    'customer service',
+    'representative',
+    'speak to a human',
+    'talk to someone',
+    'call me',
+    'contact me'
+)
+
+# One alternation matches every keyword in a single pass over the prompt
+CS_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in sorted(CS_KEYWORDS, key=len, reverse=True)))
+
+NAME_PATTERNS = (
+    re.compile(r"show\s+(?:me\s+)?(?:the\s+)?(?:orders?\s+(?:for|of)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)"),
+    re.compile(r"(?:what\s+(?:are|were)\s+)?([a-zA-Z]+)\s+([a-zA-Z]+)(?:'s)?\s+orders?"),
+    re.compile(r"find\s+(?:the\s+)?orders?\s+(?:for|of)\s+([a-zA-Z]+)\s+([a-zA-Z]+)"),
+)
+NAME_LIST_PATTERN = re.compile(r"orders?\s+(?:for|of)\s+(.+)")
+NAME_LIST_SEPARATOR = re.compile(r"\s*(?:,|&|\band\b)\s*")
+FULL_NAME_PATTERN = re.compile(r"([a-zA-Z]+)\s+([a-zA-Z]+)\W*")
+ORDER_PAGE_PATTERN = re.compile(r"\bpage\s+(\d+)\b", re.IGNORECASE)
+
+
+def extract_order_page(prompt: str) -> tuple[str, int]:
+    """Split a trailing 'page N' off an order request, returning the remaining prompt and page"""
+    match = ORDER_PAGE_PATTERN.search(prompt)
+    if not match:
+        return prompt, 1
+    return ORDER_PAGE_PATTERN.sub(' ', prompt).strip(), max(1, int(match.group(1)))
+
+
+def extract_customer_name(prompt: str) -> tuple[str, str] | None:
+    """Extract first and last name from prompt using regex"""
+    lowered = prompt.lower()
+    for pattern in NAME_PATTERNS:
+        match = pattern.search(lowered)
+        if match:
+            return match.group(1).title(), match.group(2).title()
+    return None
+
+
+def extract_customer_names(prompt: str) -> list[tuple[str, str]]:
+    """Extract every first/last name pair from prompts like 'orders for Jane Doe and John Smith'"""
+    match = NAME_LIST_PATTERN.search(prompt.lower())
+    if match:
+        names = []
+        for part in NAME_LIST_SEPARATOR.split(match.group(1)):
+            name = FULL_NAME_PATTERN.fullmatch(part.strip())
+            if name and (name.group(1).title(), name.group(2).title()) not in names:
+                names.append((name.group(1).title(), name.group(2).title()))
+        if names:
+            return names
+
+    name = extract_customer_name(prompt)
+    return [name] if name else []
+
+
+class RoutedPrompt:
+    """
+    A prompt normalized once, with every routing feature computed up front.
+    loose_names is set when the names came from 'show me X Y' without mentioning orders, which
+    ordinary questions ('show me wooden balls') match too.
+    """
+    __slots__ = ('text', 'lower', 'digit_count', 'is_cs_request', 'is_phone_number', 'order_prompt', 'page', 'names',
+                 'loose_names')
+
+    def __init__(self, prompt: str):
+        self.text = prompt
+        self.lower = prompt.lower()
+        self.digit_count = sum(map(str.isdigit, prompt))
+        self.is_cs_request = CS_PATTERN.search(self.lower) is not None
+        self.is_phone_number = self.digit_count >= 10
+
+        # Every name pattern needs 'order' or 'show', so skip the regexes when neither appears
+        if 'order' in self.lower or 'show' in self.lower:
+            self.order_prompt, self.page = extract_order_page(prompt)
+            self.names = extract_customer_names(self.order_prompt)
+            self.loose_names = bool(self.names) and 'order' not in self.lower
+        else:
+            self.order_prompt, self.page = prompt, 1
+            self.names = []
+            self.loose_names = False
+
+
+class Route:
+    """A registered intent: a matcher deciding if it applies and an optional handler producing chunks"""
+    __slots__ = ('intent', 'matcher', 'handler', 'priority')
+
+    def __init__(self, intent: str, matcher: Callable, handler: Optional[Callable], priority: int):
+        self.intent = intent
+        self.matcher = matcher
+        self.handler = handler
+        self.priority = priority
+
+
+class IntentRouter:
+    """
+    Table-driven router: routes are tried in priority order against a RoutedPrompt.
+    Handlers return an iterable of response chunks, or None to pass to the next matching route.
+    """
+
+    def __init__(self):
+        self.routes: List[Route] = []
+
+    def register(self, intent: str, matcher: Callable, handler: Optional[Callable] = None, priority: int = 100) -> None:
+        """Add or replace the route for an intent; lower priority values are tried first"""
+        self.routes = [route for route in self.routes if route.intent != intent]
+        self.routes.append(Route(intent, matcher, handler, priority))
+        self.routes.sort(key=lambda route: route.priority)
+
+    def set_handler(self, intent: str, handler: Optional[Callable]) -> None:
+        """Attach a handler to an already registered intent"""
+        for route in self.routes:
+            if route.intent == intent:
+                route.handler = handler
+                return
+        raise KeyError(f"Unknown intent: {intent}")
+
+    def matches(self, routed: RoutedPrompt, context: Dict) -> Iterable[Route]:
+        """Yield the routes that match, in priority order"""
+        for route in self.routes:
+            if route.matcher(routed, context):
+                yield route
+
+    def route(self, routed: RoutedPrompt, context: Dict) -> Optional[str]:
+        """Return the intent of the highest-priority matching route"""
+        for route in self.matches(routed, context):
+            return route.intent
+        return None
+
+
+def build_default_router() -> IntentRouter:
+    """Router with the chatbot's matchers; bedrock_utils attaches the handlers"""
+    router = IntentRouter()
+    router.register('orders', lambda routed, context: bool(routed.names) and context.get('dynamodb') is not None, priority=10)
+    router.register('customer_service', lambda routed, context: routed.is_cs_request, priority=20)
+    router.register('phone_capture', lambda routed, context: routed.is_phone_number or bool(context.get('phone_number')), priority=30)
+    router.register('rag', lambda routed, context: True, priority=1000)
+    return router
@@ -0,0 +1,162 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(label_key: Tuple, extra: Dict[str, str] = None) -> str:
+    items = list(label_key) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+
+class MetricsRegistry:
+    """Process-wide counters, latency histograms and gauges rendered in Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+
+    def increment(self, name: str, value: float = 1.0, **labels) -> None:
+        """Add to a counter"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        """Record one latency observation in a histogram"""
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(LATENCY_BUCKETS), 'count': 0, 'sum': 0.0}
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+
+    def register_gauge(self, name: str, callback: Callable[[], float]) -> None:
+        """Register a gauge whose value is read when metrics are rendered"""
+        self.gauges[name] = callback
+
+    def render(self) -> str:
+        """Render every metric in Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for (name, label_key), value in sorted(self.counters.items()):
+                lines.append(f"{name}{_format_labels(label_key)} {value}")
+            for (name, label_key), histogram in sorted(self.histograms.items()):
+                for bound, count in zip(LATENCY_BUCKETS, histogram['buckets']):
+                    lines.append(f"{name}_bucket{_format_labels(label_key, {'le': str(bound)})} {count}")
+                lines.append(f"{name}_bucket{_format_labels(label_key, {'le': '+Inf'})} {histogram['count']}")
+                lines.append(f"{name}_sum{_format_labels(label_key)} {histogram['sum']}")
+                lines.append(f"{name}_count{_format_labels(label_key)} {histogram['count']}")
+        for name, callback in sorted(self.gauges.items()):
+            try:
+                lines.append(f"{name} {float(callback())}")
+            except Exception as e:
+                logger.warning("Gauge %s failed: %s", name, e)
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+
+@contextmanager
+def span(stage: str, **labels):
+    """Time a stage into the stage_duration_seconds histogram and log it at debug level"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.observe('stage_duration_seconds', elapsed, stage=stage, **labels)
+        logger.debug("span stage=%s duration_ms=%.2f labels=%s", stage, elapsed * 1000, labels)
+
+
+class StreamTimer:
+    """Tracks time-to-first-token and throughput for one model stream"""
+
+    def __init__(self, model_id: str):
+        self.model_id = model_id
+        self.start = time.perf_counter()
+        self.first_token_at = None
+        self.chunks = 0
+        self.chars = 0
+
+    def chunk(self, text: str) -> None:
+        """Record a streamed chunk"""
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            metrics.observe('model_ttft_seconds', self.first_token_at - self.start, model=self.model_id)
+        self.chunks += 1
+        self.chars += len(text)
+
+    def finish(self, output_tokens: int = None) -> None:
+        """Record stream duration and tokens/sec; tokens are estimated from characters if not reported"""
+        elapsed = time.perf_counter() - self.start
+        tokens = output_tokens if output_tokens is not None else self.chars / 4
+        metrics.observe('model_stream_seconds', elapsed, model=self.model_id)
+        metrics.increment('model_output_tokens_total', tokens, model=self.model_id)
+
+        streaming_time = elapsed - ((self.first_token_at or self.start) - self.start)
+        tokens_per_second = tokens / streaming_time if streaming_time > 0 else 0.0
+        logger.info(
+            "model stream model=%s ttft_ms=%.1f duration_ms=%.1f chunks=%d tokens=%d tokens_per_sec=%.1f",
+            self.model_id,
+            ((self.first_token_at or time.perf_counter()) - self.start) * 1000,
+            elapsed * 1000,
+            self.chunks,
+            tokens,
+            tokens_per_second
+        )
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = metrics.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug("metrics endpoint: " + format, *args)
+
+
+_metrics_server = None
+_metrics_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: int = None):
+    """Serve /metrics on METRICS_PORT in a daemon thread, once per process; no-op when unset"""
+    global _metrics_server
+    port = port or int(os.getenv('METRICS_PORT', '0'))
+    if not port:
+        return None
+    with _metrics_server_lock:
+        if _metrics_server is None:
+            _metrics_server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+            threading.Thread(target=_metrics_server.serve_forever, daemon=True).start()
+            logger.info("Metrics endpoint listening on port %d", port)
+    return _metrics_server
@@ -0,0 +1,17 @@
+import logging
+import sys
+from dynamo_utils import init_dynamodb, create_name_index, backfill_name_keys
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2 or sys.argv[1] not in ('create-index', 'backfill'):
+        print("Usage: python migrate_name_index.py [create-index|backfill]")
+        sys.exit(1)
+
+    dynamodb = init_dynamodb()
+    if sys.argv[1] == 'create-index':
+        create_name_index(dynamodb)
+    else:
+        backfill_name_keys(dynamodb)
+        print("Once every writer sets name_key, set CUSTOMER_NAME_INDEX_COMPLETE=true to stop confirming misses with a scan")
@@ -0,0 +1,273 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List, Tuple
+
+from metrics_utils import metrics, StreamTimer
+
+logger = logging.getLogger(__name__)
+
+MODEL_ID = os.getenv('BEDROCK_MODEL_ID', 'anthropic.claude-instant-v1')
+# Must accept the same request body as MODEL_ID; empty disables the fallback
+FALLBACK_MODEL_ID = os.getenv('BEDROCK_FALLBACK_MODEL_ID', '')
+FIRST_TOKEN_TIMEOUT = float(os.getenv('MODEL_FIRST_TOKEN_TIMEOUT', '10'))
+TOTAL_TIMEOUT = float(os.getenv('MODEL_TOTAL_TIMEOUT', '60'))
+# Seconds without a first token before a duplicate request is sent; 0 disables hedging
+HEDGE_DELAY = float(os.getenv('MODEL_HEDGE_DELAY', '0'))
+BREAKER_FAILURES = int(os.getenv('MODEL_BREAKER_FAILURES', '5'))
+BREAKER_RESET = float(os.getenv('MODEL_BREAKER_RESET', '30'))
+
+
+class ModelUnavailable(Exception):
+    """No model produced a first token within its deadline"""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a model after failure_threshold consecutive failures.
+    After reset_timeout one trial request is let through; its outcome closes or reopens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURES, reset_timeout: float = BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now"""
+        with self._lock:
+            if self.state == 'closed':
+                return True
+            if self.state == 'open' and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = 'half_open'
+                logger.info("Circuit for %s half-open, sending a trial request", self.name)
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != 'closed':
+                logger.info("Circuit for %s closed", self.name)
+            self.state = 'closed'
+            self.failures = 0
+
+    def release_trial(self) -> None:
+        """Return an unfinished half-open trial to open so the next request can run a new trial"""
+        with self._lock:
+            if self.state == 'half_open':
+                self.state = 'open'
+                self.opened_at = time.monotonic() - self.reset_timeout
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half_open' or (self.state == 'closed' and self.failures >= self.failure_threshold):
+                self.state = 'open'
+                self.opened_at = time.monotonic()
+                metrics.increment('model_circuit_open_total', model=self.name)
+                logger.warning("Circuit for %s opened after %d failure(s)", self.name, self.failures)
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(model_id: str) -> CircuitBreaker:
+    """Return the process-wide circuit breaker for a model"""
+    with _breakers_lock:
+        if model_id not in _breakers:
+            _breakers[model_id] = CircuitBreaker(model_id)
+        return _breakers[model_id]
+
+
+class _Attempt:
+    """One streaming request, read on a daemon thread into a queue shared with other attempts"""
+
+    def __init__(self, runtime_client, model_id: str, body: str, events: queue.Queue, hedge: bool = False):
+        self.runtime_client = runtime_client
+        self.model_id = model_id
+        self.body = body
+        self.events = events
+        self.hedge = hedge
+        self.cancelled = threading.Event()
+        self.stream = None
+        self.timer = StreamTimer(model_id)
+        threading.Thread(target=self._read, daemon=True, name=f"model-{model_id}").start()
+
+    def _read(self) -> None:
+        try:
+            response = self.runtime_client.invoke_model_with_response_stream(
+                modelId=self.model_id,
+                body=self.body,
+                contentType="application/json",
+                accept="application/json"
+            )
+            self.stream = response.get('body')
+            for event in self.stream:
+                if self.cancelled.is_set():
+                    return
+                if 'chunk' in event:
+                    chunk_data = json.loads(event['chunk']['bytes'].decode())
+                    self.events.put((self, 'text', chunk_data.get('completion', '')))
+                    # Bedrock reports exact token counts on the final chunk
+                    invocation_metrics = chunk_data.get('amazon-bedrock-invocationMetrics')
+                    if invocation_metrics:
+                        self.events.put((self, 'metrics', invocation_metrics.get('outputTokenCount')))
+            self.events.put((self, 'done', None))
+        except Exception as e:
+            self.events.put((self, 'error', e))
+
+    def cancel(self) -> None:
+        """Stop reading; the loser of a hedge or a timed-out request is abandoned"""
+        self.cancelled.set()
+        close = getattr(self.stream, 'close', None)
+        if close is not None:
+            try:
+                close()
+            except Exception as e:
+                logger.debug("Closing abandoned stream failed: %s", e)
+
+
+class ModelStream:
+    """
+    Streams completion text for one request body with bounded latency.
+    Each model gets first_token_timeout to start answering, with an optional hedged duplicate
+    after hedge_delay; on failure the next model in model_ids is tried, skipping open circuits.
+    Raises ModelUnavailable before any text is yielded if no model starts in time.
+    After the first token the stream is cut at total_timeout and completed is left False.
+    """
+
+    def __init__(self, runtime_client, body: Dict, model_ids: List[str] = None, first_token_timeout: float = None,
+                 total_timeout: float = None, hedge_delay: float = None):
+        self.runtime_client = runtime_client
+        self.body = json.dumps(body)
+        self.model_ids = model_ids or [model_id for model_id in (MODEL_ID, FALLBACK_MODEL_ID) if model_id]
+        self.first_token_timeout = FIRST_TOKEN_TIMEOUT if first_token_timeout is None else first_token_timeout
+        self.total_timeout = TOTAL_TIMEOUT if total_timeout is None else total_timeout
+        self.hedge_delay = HEDGE_DELAY if hedge_delay is None else hedge_delay
+        self.model_id = None
+        self.completed = False
+
+    def _fail(self, attempt: _Attempt, reason: str) -> None:
+        attempt.cancel()
+        metrics.increment('model_attempts_total', model=attempt.model_id, outcome=reason)
+        # A hedge failing alongside its primary is one failure of the model, not two
+        if not attempt.hedge:
+            get_breaker(attempt.model_id).record_failure()
+
+    def _start(self, events: queue.Queue) -> Tuple:
+        """Wait for the first model to produce text; returns the winning attempt's first event"""
+        deadline = time.monotonic() + self.total_timeout
+        candidates = list(self.model_ids)
+        last_error = "all model circuits are open"
+
+        while candidates:
+            model_id = candidates.pop(0)
+            if not get_breaker(model_id).allow():
+                logger.warning("Skipping %s: circuit open", model_id)
+                continue
+
+            live = [_Attempt(self.runtime_client, model_id, self.body, events)]
+            started = time.monotonic()
+            first_token_deadline = min(started + self.first_token_timeout, deadline)
+            hedge_at = started + self.hedge_delay if self.hedge_delay > 0 else None
+
+            while live:
+                wait_until = min(first_token_deadline, hedge_at) if hedge_at else first_token_deadline
+                try:
+                    attempt, kind, payload = events.get(timeout=max(0.0, wait_until - time.monotonic()))
+                except queue.Empty:
+                    if hedge_at and time.monotonic() >= hedge_at and time.monotonic() < first_token_deadline:
+                        logger.info("No first token from %s after %.2fs, sending hedged request",
+                                    model_id, self.hedge_delay)
+                        metrics.increment('model_hedges_total', model=model_id)
+                        live.append(_Attempt(self.runtime_client, model_id, self.body, events, hedge=True))
+                        hedge_at = None
+                        continue
+                    logger.warning("No first token from %s within %.2fs", model_id, self.first_token_timeout)
+                    metrics.increment('model_deadline_exceeded_total', model=model_id, deadline='first_token')
+                    for attempt in live:
+                        self._fail(attempt, 'first_token_timeout')
+                    last_error = f"{model_id} missed its first-token deadline"
+                    break
+
+                if attempt not in live:
+                    continue
+                if kind == 'error':
+                    logger.error("Model request to %s failed: %s", model_id, payload)
+                    live.remove(attempt)
+                    self._fail(attempt, 'error')
+                    last_error = f"{model_id}: {payload}"
+                    continue
+                # First text, or an empty but finished stream, decides the winner
+                for other in live:
+                    if other is not attempt:
+                        other.cancel()
+                if attempt.hedge:
+                    metrics.increment('model_hedge_wins_total', model=model_id)
+                return attempt, kind, payload
+
+            if time.monotonic() >= deadline:
+                break
+
+        raise ModelUnavailable(last_error)
+
+    def __iter__(self):
+        events = queue.Queue()
+        start = time.monotonic()
+        first_event = self._start(events)
+        winner = first_event[0]
+        self.model_id = winner.model_id
+        if self.model_id != self.model_ids[0]:
+            metrics.increment('model_fallbacks_total', model=self.model_id)
+
+        output_tokens = None
+        deadline = start + self.total_timeout
+        settled = False
+        try:
+            while True:
+                try:
+                    if first_event is not None:
+                        (attempt, kind, payload), first_event = first_event, None
+                    else:
+                        attempt, kind, payload = events.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    logger.warning("Stream from %s exceeded the %.1fs total deadline",
+                                   self.model_id, self.total_timeout)
+                    metrics.increment('model_deadline_exceeded_total', model=self.model_id, deadline='total')
+                    self._fail(winner, 'total_timeout')
+                    settled = True
+                    break
+                if attempt is not winner:
+                    continue
+                if kind == 'text':
+                    winner.timer.chunk(payload)
+                    yield payload
+                elif kind == 'metrics':
+                    output_tokens = payload
+                elif kind == 'error':
+                    logger.error("Stream from %s failed mid-response: %s", self.model_id, payload)
+                    self._fail(winner, 'error')
+                    settled = True
+                    break
+                else:
+                    self.completed = True
+                    metrics.increment('model_attempts_total', model=self.model_id, outcome='success')
+                    get_breaker(self.model_id).record_success()
+                    settled = True
+                    break
+        finally:
+            if not settled:
+                # The caller stopped reading: stop pulling (and paying for) the stream, and don't
+                # leave a half-open trial holding the circuit shut
+                winner.cancel()
+                metrics.increment('model_attempts_total', model=self.model_id, outcome='abandoned')
+                get_breaker(self.model_id).release_trial()
+            winner.timer.finish(output_tokens)
@@ -0,0 +1,60 @@
+import logging
+import os
+import time
+
+from metrics_utils import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class StreamRenderBuffer:
+    """
+    Coalesces streamed chunks before re-rendering a Streamlit placeholder.
+    Renders when flush_interval seconds have passed or flush_chars characters are pending.
+    """
+
+    def __init__(self, placeholder, flush_interval: float = None, flush_chars: int = None, cursor: str = "▌"):
+        self.placeholder = placeholder
+        self.flush_interval = flush_interval if flush_interval is not None else float(os.getenv('RENDER_FLUSH_INTERVAL', '0.05'))
+        self.flush_chars = flush_chars if flush_chars is not None else int(os.getenv('RENDER_FLUSH_CHARS', '200'))
+        self.cursor = cursor
+        self.text = ""
+        self.pending_chars = 0
+        self.chunk_count = 0
+        self.render_count = 0
+        self.render_seconds = 0.0
+        # Render the first chunk immediately so time-to-first-token isn't delayed
+        self.last_render = float('-inf')
+
+    def append(self, chunk: str) -> None:
+        """Add a chunk, rendering only if the time or size budget is exhausted"""
+        self.text += chunk
+        self.pending_chars += len(chunk)
+        self.chunk_count += 1
+        if self.pending_chars >= self.flush_chars or time.monotonic() - self.last_render >= self.flush_interval:
+            self._render(self.text + self.cursor)
+
+    def finish(self) -> str:
+        """Render the final text without the cursor and return it"""
+        self._render(self.text)
+        metrics.observe('stage_duration_seconds', self.render_seconds, stage='render')
+        metrics.increment('render_calls_total', self.render_count)
+        logger.debug("Rendered %s chunks in %s renders", self.chunk_count, self.render_count)
+        return self.text
+
+    def _render(self, text: str) -> None:
+        start = time.perf_counter()
+        self.placeholder.markdown(text)
+        self.render_seconds += time.perf_counter() - start
+        self.pending_chars = 0
+        self.render_count += 1
+        self.last_render = time.monotonic()
+
+    def stats(self) -> dict:
+        """Return chunk and render counts for tuning the flush budgets"""
+        return {
+            'chunks': self.chunk_count,
+            'renders': self.render_count,
+            'render_seconds': self.render_seconds,
+            'chars': len(self.text)
+        }
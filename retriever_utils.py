@@ -0,0 +1,243 @@
+import logging
+import os
+import re
+from typing import List, Dict
+
+import numpy as np
+
+from cache_utils import TTLCache, normalize_text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_KB_TEXT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rivertown_kb.txt')
+
+# Common words that carry no retrieval signal for our corpus
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i if in is it its
+me my of on or our so than that the their them then there these they this to us
+was we what when where which who why will with you your
+""".split())
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+CATEGORY_PATTERN = re.compile(r"(?:\A|\n---\n\n)\n### ([^\n]+)\n")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase and split text into word tokens, dropping stopwords"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def read_kb_text(path: str) -> str:
+    """Read knowledge base text, tolerating the cp1252 output of older conversions"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return raw.decode('cp1252', errors='replace')
+
+
+def split_kb_text(text: str, max_chars: int = 1500) -> List[Dict]:
+    """Split convert_to_text.py output into passages tagged with their category"""
+    passages = []
+
+    # Category headers follow a separator and a blank line; entry sub-headings do not
+    sections = CATEGORY_PATTERN.split(text)
+    for category, body in zip(sections[1::2], sections[2::2]):
+        for entry in body.split("\n---\n"):
+            # Group paragraphs into passages no longer than max_chars
+            current = ''
+            for paragraph in re.split(r"\n\s*\n", entry):
+                paragraph = paragraph.strip()
+                if not paragraph:
+                    continue
+                if current and len(current) + len(paragraph) + 2 > max_chars:
+                    passages.append({'text': current, 'category': category.strip()})
+                    current = paragraph
+                else:
+                    current = f"{current}\n\n{paragraph}" if current else paragraph
+            if current:
+                passages.append({'text': current, 'category': category.strip()})
+    return passages
+
+
+class LocalRetriever:
+    """In-process BM25 retriever over the converted knowledge base text"""
+
+    def __init__(self, passages: List[Dict], k1: float = 1.5, b: float = 0.75):
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+
+        docs = [tokenize(p['text']) for p in passages]
+        vocab = sorted({token for doc in docs for token in doc})
+        self.vocab = {token: i for i, token in enumerate(vocab)}
+
+        # Term frequency matrix, one row per passage
+        tf = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for token in doc:
+                tf[row, self.vocab[token]] += 1
+
+        self.weights = self._bm25_weights(tf)
+
+    def _bm25_weights(self, tf: np.ndarray) -> np.ndarray:
+        """Precompute the BM25 weight of every term in every passage"""
+        if tf.size == 0:
+            return tf
+        doc_len = tf.sum(axis=1, keepdims=True)
+        avg_len = max(float(doc_len.mean()), 1.0)
+        doc_freq = (tf > 0).sum(axis=0)
+        idf = np.log(1 + (tf.shape[0] - doc_freq + 0.5) / (doc_freq + 0.5)).astype(np.float32)
+        norm = self.k1 * (1 - self.b + self.b * doc_len / avg_len)
+        return idf * tf * (self.k1 + 1) / (tf + norm)
+
+    @classmethod
+    def from_text_file(cls, path: str = DEFAULT_KB_TEXT, max_chars: int = 1500) -> "LocalRetriever":
+        """Build an index from a convert_to_text.py output file"""
+        retriever = cls(split_kb_text(read_kb_text(path), max_chars=max_chars))
+        logger.info("Built local index with %s passages from %s", len(retriever.passages), path)
+        return retriever
+
+    def save(self, path: str) -> None:
+        """Write the prebuilt index to a .npz file"""
+        vocab = sorted(self.vocab, key=self.vocab.get)
+        np.savez_compressed(
+            path,
+            weights=self.weights,
+            params=np.array([self.k1, self.b]),
+            vocab=np.array(vocab, dtype=str),
+            texts=np.array([p['text'] for p in self.passages], dtype=str),
+            categories=np.array([p.get('category', '') for p in self.passages], dtype=str),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LocalRetriever":
+        """Load an index previously written with save()"""
+        data = np.load(path)
+        retriever = cls.__new__(cls)
+        retriever.k1, retriever.b = (float(x) for x in data['params'])
+        retriever.passages = [
+            {'text': text, 'category': category}
+            for text, category in zip(data['texts'].tolist(), data['categories'].tolist())
+        ]
+        retriever.vocab = {token: i for i, token in enumerate(data['vocab'].tolist())}
+        retriever.weights = data['weights']
+        logger.info("Loaded local index with %s passages from %s", len(retriever.passages), path)
+        return retriever
+
+    def retrieve(self, query: str, number_of_results: int = 3) -> List[Dict]:
+        """Return the top passages for a query as {'text', 'score'} dicts"""
+        term_ids = [self.vocab[token] for token in tokenize(query) if token in self.vocab]
+        if not term_ids or not self.passages:
+            return []
+
+        scores = self.weights[:, term_ids].sum(axis=1)
+        k = min(number_of_results, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {'text': self.passages[i]['text'], 'score': float(scores[i])}
+            for i in top if scores[i] > 0
+        ]
+
+
+class BedrockRetriever:
+    """Retriever backed by a Bedrock Knowledge Base"""
+
+    def __init__(self, agent_runtime_client, knowledge_base_id: str = "6U5LGL6AYD"):
+        self.client = agent_runtime_client
+        self.knowledge_base_id = knowledge_base_id
+
+    def retrieve(self, query: str, number_of_results: int = 3) -> List[Dict]:
+        """Return the top passages for a query as {'text', 'score'} dicts"""
+        retrieve_response = self.client.retrieve(
+            knowledgeBaseId=self.knowledge_base_id,
+            retrievalQuery={
+                "text": query
+            },
+            retrievalConfiguration={
+                "vectorSearchConfiguration": {
+                    "numberOfResults": number_of_results
+                }
+            }
+        )
+
+        results = []
+        for result in retrieve_response.get('retrievalResults', []):
+            content = (
+                result.get('content', {}).get('text', '') or
+                result.get('content', '') or
+                ''
+            )
+            if content:
+                results.append({'text': content, 'score': result.get('score', 0.0)})
+        return results
+
+
+class CachedRetriever:
+    """Wraps a retriever with a TTL/LRU cache keyed on the normalized query"""
+
+    def __init__(self, retriever, max_size: int = 512, ttl: float = 600.0):
+        self.retriever = retriever
+        self.cache = TTLCache(max_size=max_size, ttl=ttl)
+
+    def retrieve(self, query: str, number_of_results: int = 3) -> List[Dict]:
+        """Return cached results when available, otherwise query the wrapped retriever"""
+        knowledge_base_id = getattr(self.retriever, 'knowledge_base_id', 'local')
+        key = (normalize_text(query), knowledge_base_id, number_of_results)
+
+        results = self.cache.get(key)
+        if results is None:
+            results = self.retriever.retrieve(query, number_of_results=number_of_results)
+            self.cache.set(key, results)
+
+        # Hand out copies so callers cannot mutate cached entries
+        return [dict(result) for result in results]
+
+    def invalidate(self) -> None:
+        """Drop all cached results, e.g. after the knowledge base is re-ingested"""
+        self.cache.clear()
+        logger.info("Retrieval cache invalidated")
+
+
+def init_retriever(agent_runtime_client=None, backend: str = None, knowledge_base_id: str = "6U5LGL6AYD"):
+    """
+    Initialize the retriever selected by RETRIEVER_BACKEND ('bedrock' or 'local').
+    The local backend loads LOCAL_INDEX_PATH if it exists, otherwise builds from LOCAL_KB_TEXT.
+    Results are cached unless RETRIEVAL_CACHE_SIZE is 0.
+    """
+    backend = (backend or os.getenv('RETRIEVER_BACKEND', 'bedrock')).lower()
+
+    if backend == 'local':
+        index_path = os.getenv('LOCAL_INDEX_PATH')
+        if index_path and os.path.exists(index_path):
+            retriever = LocalRetriever.load(index_path)
+        else:
+            retriever = LocalRetriever.from_text_file(os.getenv('LOCAL_KB_TEXT', DEFAULT_KB_TEXT))
+    elif backend == 'bedrock':
+        if agent_runtime_client is None:
+            raise ValueError("The bedrock retriever backend requires an agent runtime client")
+        retriever = BedrockRetriever(agent_runtime_client, knowledge_base_id)
+    else:
+        raise ValueError(f"Unknown retriever backend: {backend}")
+
+    cache_size = int(os.getenv('RETRIEVAL_CACHE_SIZE', '512'))
+    if cache_size <= 0:
+        return retriever
+    return CachedRetriever(
+        retriever,
+        max_size=cache_size,
+        ttl=float(os.getenv('RETRIEVAL_CACHE_TTL', '600'))
+    )
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3:
+        print("Usage: python retriever_utils.py rivertown_kb.txt index.npz")
+        sys.exit(1)
+
+    LocalRetriever.from_text_file(sys.argv[1]).save(sys.argv[2])
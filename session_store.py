@@ -0,0 +1,249 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SESSION_TTL = float(os.getenv('SESSION_TTL', '86400'))
+SESSION_CLEANUP_INTERVAL = float(os.getenv('SESSION_CLEANUP_INTERVAL', '300'))
+
+
+def _dumps(value) -> str:
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+class SessionStore(ABC):
+    """
+    Chat sessions shared by every app process: per-session state fields plus an append-only message log.
+    Sessions idle for longer than ttl are removed by cleanup(), which writes trigger at most
+    once per cleanup_interval.
+    """
+
+    def __init__(self, ttl: float = SESSION_TTL, cleanup_interval: float = SESSION_CLEANUP_INTERVAL):
+        self.ttl = ttl
+        self.cleanup_interval = cleanup_interval
+        self._next_cleanup = 0.0
+
+    @abstractmethod
+    def load(self, session_id: str, limit: Optional[int] = None) -> Optional[Dict]:
+        """Return {'state', 'messages', 'message_count'} with at most the last limit messages, or None"""
+
+    @abstractmethod
+    def append_messages(self, session_id: str, messages: List[Dict]) -> None:
+        """Append new messages without rewriting the ones already stored"""
+
+    @abstractmethod
+    def update_state(self, session_id: str, **fields) -> None:
+        """Merge fields into the session state"""
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        """Remove a session and its messages"""
+
+    @abstractmethod
+    def cleanup(self) -> int:
+        """Remove sessions idle for longer than ttl; returns how many were removed"""
+
+    def _maybe_cleanup(self) -> None:
+        now = time.monotonic()
+        if now < self._next_cleanup:
+            return
+        self._next_cleanup = now + self.cleanup_interval
+        removed = self.cleanup()
+        if removed:
+            logger.info("Removed %d idle chat sessions", removed)
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local store; sessions are lost on restart and not shared between processes"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, session_id: str) -> Dict:
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = {'state': {}, 'messages': [], 'updated_at': 0.0}
+        session['updated_at'] = time.time()
+        return session
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> Optional[Dict]:
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return None
+            messages = session['messages'][-limit:] if limit else session['messages']
+            return {
+                'state': dict(session['state']),
+                'messages': [dict(message) for message in messages],
+                'message_count': len(session['messages'])
+            }
+
+    def append_messages(self, session_id: str, messages: List[Dict]) -> None:
+        with self._lock:
+            self._session(session_id)['messages'].extend(
+                {'role': message['role'], 'content': message['content']} for message in messages
+            )
+        self._maybe_cleanup()
+
+    def update_state(self, session_id: str, **fields) -> None:
+        with self._lock:
+            self._session(session_id)['state'].update(fields)
+        self._maybe_cleanup()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self.sessions.pop(session_id, None)
+
+    def cleanup(self) -> int:
+        cutoff = time.time() - self.ttl
+        with self._lock:
+            expired = [session_id for session_id, session in self.sessions.items() if session['updated_at'] < cutoff]
+            for session_id in expired:
+                del self.sessions[session_id]
+        return len(expired)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    SQLite store in WAL mode, so any number of processes on a host can read while one writes.
+    Messages are rows keyed by (session_id, seq); appending a turn inserts rows instead of
+    rewriting the conversation.
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        state TEXT NOT NULL DEFAULT '{}',
+        message_count INTEGER NOT NULL DEFAULT 0,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+    CREATE TABLE IF NOT EXISTS messages (
+        session_id TEXT NOT NULL,
+        seq INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        content TEXT NOT NULL,
+        PRIMARY KEY (session_id, seq)
+    ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: str = 'sessions.db', **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._local = threading.local()
+        self._connection().executescript(self.SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        # sqlite3 connections can't be shared across threads, so each thread opens its own
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _write(self, callback) -> None:
+        connection = self._connection()
+        # Take the write lock up front so concurrent appenders can't read the same message_count
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            callback(connection)
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        self._maybe_cleanup()
+
+    def _touch(self, connection: sqlite3.Connection, session_id: str) -> int:
+        """Create or refresh the session row, returning its message count"""
+        connection.execute(
+            "INSERT INTO sessions (session_id, updated_at) VALUES (?, ?) "
+            "ON CONFLICT (session_id) DO UPDATE SET updated_at = excluded.updated_at",
+            (session_id, time.time())
+        )
+        return connection.execute(
+            "SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def load(self, session_id: str, limit: Optional[int] = None) -> Optional[Dict]:
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT state, message_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        state, message_count = row
+        first_seq = max(0, message_count - limit) if limit else 0
+        messages = [
+            {'role': role, 'content': content}
+            for role, content in connection.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? AND seq >= ? ORDER BY seq",
+                (session_id, first_seq)
+            )
+        ]
+        return {'state': json.loads(state), 'messages': messages, 'message_count': message_count}
+
+    def append_messages(self, session_id: str, messages: List[Dict]) -> None:
+        def append(connection):
+            seq = self._touch(connection, session_id)
+            connection.executemany(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, seq + i, message['role'], message['content']) for i, message in enumerate(messages)]
+            )
+            connection.execute(
+                "UPDATE sessions SET message_count = ? WHERE session_id = ?", (seq + len(messages), session_id)
+            )
+        self._write(append)
+
+    def update_state(self, session_id: str, **fields) -> None:
+        def update(connection):
+            self._touch(connection, session_id)
+            state = json.loads(connection.execute(
+                "SELECT state FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0])
+            state.update(fields)
+            connection.execute("UPDATE sessions SET state = ? WHERE session_id = ?", (_dumps(state), session_id))
+        self._write(update)
+
+    def delete(self, session_id: str) -> None:
+        def delete(connection):
+            connection.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            connection.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+        self._write(delete)
+
+    def cleanup(self) -> int:
+        connection = self._connection()
+        cutoff = time.time() - self.ttl
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE updated_at < ?)",
+                (cutoff,)
+            )
+            removed = connection.execute("DELETE FROM sessions WHERE updated_at < ?", (cutoff,)).rowcount
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        return removed
+
+
+def init_session_store() -> SessionStore:
+    """Build the session store selected by SESSION_STORE ('memory' or 'sqlite')"""
+    backend = os.getenv('SESSION_STORE', 'memory').lower()
+    if backend == 'sqlite':
+        path = os.getenv('SESSION_DB_PATH', 'sessions.db')
+        logger.info("Using SQLite session store at %s", path)
+        return SQLiteSessionStore(path)
+    if backend != 'memory':
+        raise ValueError(f"Unknown SESSION_STORE backend: {backend}")
+    return MemorySessionStore()